@@ -0,0 +1,62 @@
+"""Compare startup cost of python-telegram-bot with the built-in client.
+
+Each variant runs in a fresh interpreter which imports requests first,
+since the bot needs it anyway, then imports the client and creates a bot.
+Reports the import time and the peak RSS of the process.
+
+Usage: python benchmarks/telegram_client.py [runs]
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+TOKEN = '123456:ABC-DEF1234ghIkl-zyx57W2v1u123ew11'
+
+PROBE = '''
+import json, resource, time
+import requests
+started = time.perf_counter()
+{setup}
+elapsed = time.perf_counter() - started
+print(json.dumps({{
+    'import_ms': elapsed * 1000,
+    'rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+}}))
+'''
+VARIANTS = {
+    'requests only': 'pass',
+    'python-telegram-bot': (
+        'from telegram import Bot\n'
+        f'bot = Bot(token={TOKEN!r})'
+    ),
+    'telegram_client': (
+        'from telegram_client import TelegramClient\n'
+        f'bot = TelegramClient({TOKEN!r})'
+    ),
+}
+
+
+def measure(setup):
+    """Run the probe in a new interpreter and return its measurements."""
+    output = subprocess.run(
+        [sys.executable, '-c', PROBE.format(setup=setup)],
+        cwd=ROOT, check=True, capture_output=True, text=True
+    ).stdout
+    return json.loads(output)
+
+
+def main(runs):
+    """Print median import time and peak RSS of every variant."""
+    print(f'{"variant":<22}{"import, ms":>12}{"peak RSS, MB":>15}')
+    for name, setup in VARIANTS.items():
+        samples = [measure(setup) for _ in range(runs)]
+        import_ms = statistics.median(s['import_ms'] for s in samples)
+        rss_mb = statistics.median(s['rss_mb'] for s in samples)
+        print(f'{name:<22}{import_ms:>12.1f}{rss_mb:>15.1f}')
+
+
+if __name__ == '__main__':
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10)
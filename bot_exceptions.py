@@ -8,3 +8,31 @@ class HTTPRequestError(Exception):
     """Unspecified non-OK response from API."""
 
     pass
+
+
+class APIOverloadError(HTTPRequestError):
+    """API is throttling requests or is unavailable."""
+
+    pass
+
+
+class TelegramAPIError(Exception):
+    """Telegram Bot API refused a request."""
+
+    def __init__(self, description, error_code=None, retry_after=None):
+        """Keep the error code and retry_after of the answer."""
+        super().__init__(description)
+        self.error_code = error_code
+        self.retry_after = retry_after
+
+
+class NoBotAvailableError(Exception):
+    """Every bot in the pool is throttled or revoked."""
+
+    pass
+
+
+class LeaseLostError(Exception):
+    """Another instance has taken over polling."""
+
+    pass
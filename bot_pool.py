@@ -0,0 +1,209 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import sys
+import threading
+
+from bot_exceptions import NoBotAvailableError
+
+LOAD_WINDOW = 60
+UNAUTHORIZED = 401
+TOO_MANY_REQUESTS = 429
+DEFAULT_RETRY_AFTER = 30
+
+BOT_THROTTLED_MESSAGE = 'Bot {name} is throttled for {seconds}s'
+BOT_REVOKED_MESSAGE = 'Bot {name} was rejected by Telegram: {error}'
+BOT_CHECK_MESSAGE = 'Could not check bot {name}: {error}'
+NO_BOT_MESSAGE = 'No bot can send a message to chat {chat_id} right now'
+NO_VALID_BOT_MESSAGE = 'None of the Telegram bot tokens is valid'
+
+
+def telegram_errors(*names):
+    """Return python-telegram-bot's error classes of the given names.
+
+    The package is never imported here: if it has not been loaded,
+    none of its errors can have been raised.
+    """
+    module = sys.modules.get('telegram.error')
+    if module is None:
+        return ()
+    return tuple(getattr(module, name) for name in names)
+
+
+def is_throttled(error):
+    """Return True if Telegram asked the bot to slow down."""
+    return (isinstance(error, telegram_errors('RetryAfter'))
+            or getattr(error, 'error_code', None) == TOO_MANY_REQUESTS)
+
+
+def is_revoked(error):
+    """Return True if Telegram no longer accepts the bot's token."""
+    return (isinstance(error, telegram_errors('InvalidToken'))
+            or getattr(error, 'error_code', None) == UNAUTHORIZED)
+
+
+def may_be_revoked(error):
+    """Return True if the error may mean either a bad token or a chat error.
+
+    python-telegram-bot raises Unauthorized for 401 and for 403 alike,
+    and 403 only means that a chat blocked the bot or removed it.
+    """
+    return isinstance(error, telegram_errors('Unauthorized'))
+
+
+def bot_name(token):
+    """Return the bot id part of the token, which is safe to log."""
+    return str(token).split(':')[0]
+
+
+class PooledBot:
+    """A bot of the pool with its health and recent load."""
+
+    def __init__(self, name, client):
+        """Wrap the client under a name safe to log."""
+        self.name = name
+        self.client = client
+        self.revoked = False
+        self.throttled_until = 0.0
+        self.chats = 0
+        self.sent = 0
+        self.throttles = 0
+        self.recent = deque()
+
+    def available(self, now):
+        """Return True if the bot can send right now."""
+        return not self.revoked and now >= self.throttled_until
+
+    def load(self, now):
+        """Return the number of messages sent within the load window."""
+        while self.recent and self.recent[0] <= now - LOAD_WINDOW:
+            self.recent.popleft()
+        return len(self.recent)
+
+
+class BotPool:
+    """Spread messages over several bots, duck-typed as a single bot.
+
+    Each chat sticks to the bot it was first given, new chats go to
+    the least loaded bot. A throttled bot is skipped until its
+    retry_after passes and a revoked bot is dropped; their chats are
+    moved to another bot. Every bot must be allowed to message
+    the chats it may be given.
+    """
+
+    def __init__(self, clients, clock):
+        """Pool (name, client) pairs."""
+        self.bots = [PooledBot(name, client) for name, client in clients]
+        self.clock = clock
+        self.assignments = {}
+        self._lock = threading.Lock()
+
+    def _pick(self, chat_id, tried):
+        now = self.clock.time()
+        with self._lock:
+            bot = self.assignments.get(chat_id)
+            if bot and bot not in tried and bot.available(now):
+                return bot
+            candidates = [
+                candidate for candidate in self.bots
+                if candidate not in tried and candidate.available(now)
+            ]
+            if not candidates:
+                raise NoBotAvailableError(
+                    NO_BOT_MESSAGE.format(chat_id=chat_id)
+                )
+            choice = min(
+                candidates,
+                key=lambda candidate: (candidate.load(now), candidate.chats)
+            )
+            if bot:
+                bot.chats -= 1
+            choice.chats += 1
+            self.assignments[chat_id] = choice
+            return choice
+
+    def _rejects_token(self, bot):
+        """Ask Telegram whether the bot's token is still accepted."""
+        try:
+            bot.client.get_me()
+        except Exception as error:
+            return is_revoked(error) or may_be_revoked(error)
+        return False
+
+    def _failed(self, bot, error):
+        """Take the bot out of rotation if the error is about the bot."""
+        if is_throttled(error):
+            seconds = getattr(error, 'retry_after', None)
+            seconds = seconds or DEFAULT_RETRY_AFTER
+            logging.warning(BOT_THROTTLED_MESSAGE.format(
+                name=bot.name, seconds=seconds
+            ))
+            with self._lock:
+                bot.throttles += 1
+                bot.throttled_until = self.clock.time() + seconds
+            return True
+        if is_revoked(error) or (
+            may_be_revoked(error) and self._rejects_token(bot)
+        ):
+            logging.error(BOT_REVOKED_MESSAGE.format(
+                name=bot.name, error=error
+            ))
+            with self._lock:
+                bot.revoked = True
+            return True
+        return False
+
+    def send_message(self, chat_id, text, **kwargs):
+        """Send through the chat's bot, failing over to the others."""
+        tried = set()
+        while True:
+            bot = self._pick(chat_id, tried)
+            try:
+                result = bot.client.send_message(
+                    chat_id=chat_id, text=text, **kwargs
+                )
+            except Exception as error:
+                if not self._failed(bot, error):
+                    raise
+                tried.add(bot)
+                continue
+            with self._lock:
+                bot.sent += 1
+                bot.recent.append(self.clock.time())
+            return result
+
+    def check(self):
+        """Validate every bot concurrently and drop the rejected ones.
+
+        Bots which could not be checked for other reasons are kept.
+        Raises NoBotAvailableError if no bot is left.
+        """
+        def validate(bot):
+            try:
+                bot.client.get_me()
+            except Exception as error:
+                if not self._failed(bot, error):
+                    logging.warning(BOT_CHECK_MESSAGE.format(
+                        name=bot.name, error=error
+                    ))
+
+        with ThreadPoolExecutor(len(self.bots)) as executor:
+            list(executor.map(validate, self.bots))
+        if all(bot.revoked for bot in self.bots):
+            raise NoBotAvailableError(NO_VALID_BOT_MESSAGE)
+
+    def metrics(self):
+        """Return the state and load of every bot."""
+        now = self.clock.time()
+        with self._lock:
+            return {
+                bot.name: {
+                    'available': bot.available(now),
+                    'revoked': bot.revoked,
+                    'chats': bot.chats,
+                    'sent': bot.sent,
+                    'throttles': bot.throttles,
+                    'load': bot.load(now),
+                }
+                for bot in self.bots
+            }
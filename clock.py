@@ -0,0 +1,59 @@
+import heapq
+import itertools
+import time
+
+
+class SystemClock:
+    """Wall-clock time source used in production."""
+
+    def time(self):
+        """Return current time in seconds since the epoch."""
+        return time.time()
+
+    def sleep(self, seconds):
+        """Block the calling thread for the given number of seconds."""
+        time.sleep(seconds)
+
+
+class VirtualClock:
+    """Deterministic time source which only moves forward on sleep.
+
+    Callbacks registered with call_at/call_later/call_every are fired
+    in chronological order while the clock is advanced by sleep().
+    An exception raised by a callback propagates out of sleep(),
+    which is how a simulation interrupts the loop it is driving.
+    """
+
+    def __init__(self, start=0.0):
+        """Start the clock at the given moment."""
+        self.now = start
+        self._queue = []
+        self._order = itertools.count()
+
+    def time(self):
+        """Return current virtual time."""
+        return self.now
+
+    def call_at(self, when, callback):
+        """Run callback once the clock reaches the given moment."""
+        heapq.heappush(self._queue, (when, next(self._order), callback))
+
+    def call_later(self, delay, callback):
+        """Run callback after the given number of virtual seconds."""
+        self.call_at(self.now + delay, callback)
+
+    def call_every(self, interval, callback):
+        """Run callback every interval virtual seconds."""
+        def tick():
+            self.call_later(interval, tick)
+            callback()
+        self.call_later(interval, tick)
+
+    def sleep(self, seconds):
+        """Advance the clock, firing every callback due on the way."""
+        deadline = self.now + seconds
+        while self._queue and self._queue[0][0] <= deadline:
+            when, _, callback = heapq.heappop(self._queue)
+            self.now = max(self.now, when)
+            callback()
+        self.now = deadline
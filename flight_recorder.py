@@ -0,0 +1,134 @@
+import json
+import logging
+import mmap
+import os
+import struct
+import threading
+import time
+
+SLOTS = 64
+SLOT_SIZE = 16384
+HEADER = struct.Struct('<QII')
+ENTRY = struct.Struct('<QddH16sHI')
+
+DUMP_NAME = 'flight-{tenant}-{moment}.json'
+DUMP_MESSAGE = 'Flight recorder dumped {count} entries to {path}: {reason}'
+
+
+class FlightRecorder:
+    """Ring buffer of the last API exchanges in a memory-mapped file.
+
+    Every slot keeps one exchange: when it started, how long it took,
+    the status code, the tenant, the request parameters and as much of
+    the raw body as fits. Without a path the buffer lives in anonymous
+    memory; with one it survives a crash of the process.
+    The caller is responsible for keeping secrets out of params.
+    """
+
+    def __init__(self, path=None, slots=SLOTS, slot_size=SLOT_SIZE):
+        """Map the buffer, reusing what path holds if it fits."""
+        self.slots = slots
+        self.slot_size = slot_size
+        size = HEADER.size + slots * slot_size
+        self._lock = threading.RLock()
+        self._dumped = {}
+        if path is None:
+            self._buffer = mmap.mmap(-1, size)
+        else:
+            with open(path, 'a+b') as file:
+                file.truncate(size)
+                self._buffer = mmap.mmap(file.fileno(), size)
+        sequence, stored_slots, stored_size = HEADER.unpack_from(
+            self._buffer
+        )
+        if (stored_slots, stored_size) != (slots, slot_size):
+            self._buffer[:] = bytes(size)
+            sequence = 0
+        self._sequence = sequence
+        HEADER.pack_into(self._buffer, 0, sequence, slots, slot_size)
+
+    def record(self, tenant, params, status, started, elapsed, body):
+        """Store an exchange over the oldest one."""
+        params = json.dumps(params, default=str).encode()
+        params = params[:self.slot_size - ENTRY.size]
+        capacity = self.slot_size - ENTRY.size - len(params)
+        with self._lock:
+            self._sequence += 1
+            offset = (
+                HEADER.size
+                + (self._sequence - 1) % self.slots * self.slot_size
+            )
+            ENTRY.pack_into(
+                self._buffer, offset, self._sequence, started, elapsed,
+                status or 0, tenant.encode()[:16], len(params), len(body)
+            )
+            start = offset + ENTRY.size
+            self._buffer[start:start + len(params)] = params
+            start += len(params)
+            stored = body[:capacity]
+            self._buffer[start:start + len(stored)] = stored
+            HEADER.pack_into(
+                self._buffer, 0, self._sequence, self.slots, self.slot_size
+            )
+
+    def entries(self, tenant=None):
+        """Return recorded exchanges, oldest first, for one or all tenants."""
+        entries = []
+        with self._lock:
+            for slot in range(self.slots):
+                offset = HEADER.size + slot * self.slot_size
+                (sequence, started, elapsed, status, name, params_size,
+                 body_size) = ENTRY.unpack_from(self._buffer, offset)
+                name = name.rstrip(b'\0').decode()
+                if not sequence or tenant not in (None, name):
+                    continue
+                start = offset + ENTRY.size
+                params = self._buffer[start:start + params_size]
+                start += params_size
+                stored = min(
+                    body_size, self.slot_size - ENTRY.size - params_size
+                )
+                entries.append({
+                    'sequence': sequence,
+                    'tenant': name,
+                    'started': started,
+                    'elapsed': elapsed,
+                    'status': status,
+                    'params': json.loads(params),
+                    'body': self._buffer[start:start + stored].decode(
+                        errors='replace'
+                    ),
+                    'truncated': stored < body_size,
+                })
+        return sorted(entries, key=lambda entry: entry['sequence'])
+
+    def dump(self, directory, reason, tenant=None):
+        """Write entries to a JSON file; return its path.
+
+        A tenant is not dumped twice for the same reason until it
+        has recovered, so an error repeated every cycle produces
+        a single file.
+        """
+        entries = self.entries(tenant)
+        if not entries:
+            return None
+        if tenant is not None and self._dumped.get(tenant) == str(reason):
+            return None
+        self._dumped[tenant] = str(reason)
+        path = os.path.join(directory, DUMP_NAME.format(
+            tenant=tenant or 'all',
+            moment=time.strftime('%Y%m%d-%H%M%S')
+        ))
+        with open(path, 'w', encoding='utf-8') as file:
+            json.dump(
+                {'reason': str(reason), 'entries': entries}, file,
+                ensure_ascii=False, indent=1
+            )
+        logging.error(DUMP_MESSAGE.format(
+            count=len(entries), path=path, reason=reason
+        ))
+        return path
+
+    def recovered(self, tenant):
+        """Note that the tenant's answers are fine again."""
+        self._dumped.pop(tenant, None)
@@ -0,0 +1,240 @@
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import ipaddress
+import json
+import logging
+import os
+import sys
+import threading
+import traceback
+
+CYCLE_BUDGET = 60
+CHECK_INTERVAL = 1
+STALE_AFTER = 1800
+HEALTH_HOST = '127.0.0.1'
+
+STALL_MESSAGE = ('Poll cycle has been running for {elapsed:.1f}s, '
+                 'over the {budget}s budget. Thread stacks:\n{stacks}')
+STALL_EXIT_MESSAGE = 'Poll cycle stalled for {elapsed:.1f}s, exiting'
+THREAD_STACK = 'Thread {name} ({ident}):\n{stack}'
+
+
+def format_stacks():
+    """Return the current stack of every running thread."""
+    names = {thread.ident: thread.name for thread in threading.enumerate()}
+    return '\n'.join(
+        THREAD_STACK.format(
+            name=names.get(ident, '?'), ident=ident,
+            stack=''.join(traceback.format_stack(frame))
+        )
+        for ident, frame in sys._current_frames().items()
+    )
+
+
+class Watchdog:
+    """Measure the polling loop's progress and detect stalls.
+
+    Loop lag is how much later than scheduled the loop woke up.
+    A cycle running longer than cycle_budget gets the stacks of all
+    threads logged once; with exit_after set the process exits so the
+    platform restarts it.
+    Callables registered in `metrics` are reported in health() by name.
+    A flight recorder, if given, is dumped to dump_directory whenever
+    a tenant's API answer is rejected.
+    """
+
+    def __init__(self, clock, subscriptions=(), cycle_budget=CYCLE_BUDGET,
+                 stale_after=STALE_AFTER, exit_after=None, recorder=None,
+                 dump_directory='.'):
+        """Watch the loop running on the given clock."""
+        self.clock = clock
+        self.subscriptions = subscriptions
+        self.cycle_budget = cycle_budget
+        self.stale_after = stale_after
+        self.exit_after = exit_after
+        self.recorder = recorder
+        self.dump_directory = dump_directory
+        self.cycle_started = None
+        self.wake_at = None
+        self.lag = 0.0
+        self.max_lag = 0.0
+        self.stalls = 0
+        self.cycles = 0
+        self.fetched = {}
+        self.delivered = {}
+        self.metrics = {}
+        self._dumped = False
+        self._lock = threading.Lock()
+
+    def cycle_start(self):
+        """Note the start of a poll cycle."""
+        now = self.clock.time()
+        with self._lock:
+            if self.wake_at is not None:
+                self.lag = max(now - self.wake_at, 0.0)
+                self.max_lag = max(self.max_lag, self.lag)
+            self.cycle_started = now
+            self.wake_at = None
+            self._dumped = False
+
+    def cycle_end(self, sleep):
+        """Note the end of a poll cycle followed by a sleep."""
+        now = self.clock.time()
+        with self._lock:
+            self.cycle_started = None
+            self.cycles += 1
+            self.wake_at = now + sleep
+
+    def idle(self):
+        """Note that the loop has stopped and is not expected to wake up."""
+        with self._lock:
+            self.cycle_started = None
+            self.wake_at = None
+
+    def fetch_succeeded(self, tenant):
+        """Note a successful API answer for the tenant."""
+        self.fetched[tenant] = self.clock.time()
+
+    def delivery_succeeded(self, notification, sent, delivered):
+        """Note a message delivered on behalf of the tenant."""
+        self.delivered[notification.tenant] = delivered
+
+    def payload_rejected(self, tenant, error):
+        """Dump the recent API answers of a tenant whose answer was bad."""
+        self.dump_flight(error, tenant)
+
+    def payload_accepted(self, tenant):
+        """Note that the tenant's API answer passed validation."""
+        if self.recorder is not None:
+            self.recorder.recovered(tenant)
+
+    def dump_flight(self, reason, tenant=None):
+        """Dump the flight recorder, if any; return the file's path."""
+        if self.recorder is None:
+            return None
+        return self.recorder.dump(self.dump_directory, reason, tenant)
+
+    def elapsed(self):
+        """Return how long the current cycle has been running."""
+        started = self.cycle_started
+        if started is None:
+            return 0.0
+        return self.clock.time() - started
+
+    def check(self):
+        """Dump stacks of a stalled cycle; exit if it stalls for too long."""
+        elapsed = self.elapsed()
+        if elapsed <= self.cycle_budget:
+            return
+        if not self._dumped:
+            self._dumped = True
+            self.stalls += 1
+            logging.error(STALL_MESSAGE.format(
+                elapsed=elapsed, budget=self.cycle_budget,
+                stacks=format_stacks()
+            ))
+        if self.exit_after and elapsed > self.exit_after:
+            logging.critical(STALL_EXIT_MESSAGE.format(elapsed=elapsed))
+            logging.shutdown()
+            os._exit(1)
+
+    def run(self):
+        """Check the loop forever; meant to be the target of a thread."""
+        while True:
+            self.check()
+            self.clock.sleep(CHECK_INTERVAL)
+
+    def _since(self, moments, key):
+        moment = moments.get(key)
+        if moment is None:
+            return None
+        return round(self.clock.time() - moment, 3)
+
+    def tenants(self):
+        """Return seconds since the last fetch and delivery per tenant."""
+        report = {}
+        for subscription in self.subscriptions:
+            tenant = subscription.tenant
+            report[tenant] = {
+                'since_fetch': self._since(self.fetched, tenant),
+                'since_delivery': self._since(self.delivered, tenant),
+            }
+        return report
+
+    def live(self):
+        """Return True unless the loop is stuck in a cycle or a sleep."""
+        if self.elapsed() > self.cycle_budget:
+            return False
+        wake_at = self.wake_at
+        return (wake_at is None
+                or self.clock.time() - wake_at <= self.cycle_budget)
+
+    def ready(self, tenants=None):
+        """Return True if every tenant got an API answer recently."""
+        tenants = tenants if tenants is not None else self.tenants()
+        return self.live() and all(
+            state['since_fetch'] is not None
+            and state['since_fetch'] <= self.stale_after
+            for state in tenants.values()
+        )
+
+    def health(self):
+        """Return the loop state as a JSON-serializable dict."""
+        tenants = self.tenants()
+        return {
+            'live': self.live(),
+            'ready': self.ready(tenants),
+            'cycle_elapsed': round(self.elapsed(), 3),
+            'loop_lag': round(self.lag, 3),
+            'max_loop_lag': round(self.max_lag, 3),
+            'stalls': self.stalls,
+            'tenants': tenants,
+            'metrics': {
+                name: report() for name, report in self.metrics.items()
+            },
+        }
+
+
+class HealthHandler(BaseHTTPRequestHandler):
+    """Serve /live and /ready from the server's watchdog.
+
+    /flight-recorder returns the recorded API answers, if any,
+    to local clients only: they hold students' and reviewers' data.
+    """
+
+    def do_GET(self):
+        """Answer 200 if the probe passes and 503 otherwise."""
+        watchdog = self.server.watchdog
+        if (self.path == '/flight-recorder' and watchdog.recorder is not None
+                and ipaddress.ip_address(self.client_address[0]).is_loopback):
+            self.respond(HTTPStatus.OK, watchdog.recorder.entries())
+            return
+        health = watchdog.health()
+        probes = {'/live': 'live', '/ready': 'ready', '/health': 'live'}
+        if self.path not in probes:
+            self.send_error(HTTPStatus.NOT_FOUND)
+            return
+        status = (HTTPStatus.OK if health[probes[self.path]]
+                  else HTTPStatus.SERVICE_UNAVAILABLE)
+        self.respond(status, health)
+
+    def respond(self, status, data):
+        """Send data as a JSON response."""
+        body = json.dumps(data).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        """Keep probes out of the log."""
+        pass
+
+
+def serve_health(watchdog, port, host=HEALTH_HOST):
+    """Start the health endpoint in a daemon thread and return the server."""
+    server = ThreadingHTTPServer((host, port), HealthHandler)
+    server.watchdog = watchdog
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
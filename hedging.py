@@ -0,0 +1,133 @@
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+import threading
+import time
+
+from latency import LatencyWindow
+
+HEDGE_PERCENTILE = 95
+HEDGE_BUDGET = 0.05
+MIN_SAMPLES = 20
+HEDGE_WORKERS = 8
+
+
+class HedgeBudget:
+    """Cap hedges to a fraction of all calls.
+
+    Every call earns `ratio` of a hedge, a hedge spends a whole one.
+    Unspent credit is capped so a quiet period cannot be followed by
+    a burst of hedges.
+    """
+
+    def __init__(self, ratio=HEDGE_BUDGET, burst=1):
+        """Allow `ratio` hedges per call, at most `burst` at once."""
+        self.ratio = ratio
+        self.burst = burst
+        self._credit = 0.0
+        self._lock = threading.Lock()
+
+    def earn(self):
+        """Account for a call."""
+        with self._lock:
+            self._credit = min(
+                round(self._credit + self.ratio, 9), self.burst
+            )
+
+    def spend(self):
+        """Take credit for a hedge; return False if there is none."""
+        with self._lock:
+            if self._credit < 1:
+                return False
+            self._credit -= 1
+            return True
+
+
+class HedgedCaller:
+    """Call func and send a backup call if the first one is slow.
+
+    The backup is sent once the first call has been running longer
+    than the given percentile of recent successful durations, as long
+    as the budget allows. Whichever call succeeds first wins; an error
+    is only raised if both fail.
+    With a limiter, both calls go through it and time spent waiting
+    for a slot counts neither as running nor as latency. `workers`
+    should cover two calls per concurrent caller.
+    """
+
+    def __init__(self, func, percentile=HEDGE_PERCENTILE,
+                 budget=HEDGE_BUDGET, min_samples=MIN_SAMPLES,
+                 workers=HEDGE_WORKERS, limiter=None):
+        """Hedge calls to func."""
+        self.func = func
+        self.limiter = limiter
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self.latency = LatencyWindow()
+        self.budget = HedgeBudget(budget)
+        self.calls = 0
+        self.hedges = 0
+        self.wins = 0
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(
+            workers, thread_name_prefix='hedge'
+        )
+
+    def _timed(self, running, *args):
+        def run():
+            running.set()
+            started = time.perf_counter()
+            result = self.func(*args)
+            self.latency.add(time.perf_counter() - started)
+            return result
+
+        if self.limiter is None:
+            return run()
+        return self.limiter.call(run)
+
+    def hedge_delay(self):
+        """Return how long to wait before hedging, None until warmed up."""
+        if len(self.latency) < self.min_samples:
+            return None
+        return self.latency.percentile(self.percentile)
+
+    def __call__(self, *args):
+        """Call func, hedging it if it is slower than usual."""
+        with self._lock:
+            self.calls += 1
+        self.budget.earn()
+        delay = self.hedge_delay()
+        running = threading.Event()
+        primary = self._executor.submit(self._timed, running, *args)
+        if delay is None:
+            return primary.result()
+        running.wait()
+        done, _ = wait([primary], timeout=delay)
+        if done or not self.budget.spend():
+            return primary.result()
+        with self._lock:
+            self.hedges += 1
+        backup = self._executor.submit(
+            self._timed, threading.Event(), *args
+        )
+        pending = {primary, backup}
+        error = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if future is backup:
+                        with self._lock:
+                            self.wins += 1
+                    return future.result()
+                error = error or future.exception()
+        raise error
+
+    def metrics(self):
+        """Return hedge counters and rates."""
+        return {
+            'calls': self.calls,
+            'hedges': self.hedges,
+            'wins': self.wins,
+            'hedge_rate': self.hedges / self.calls if self.calls else 0.0,
+            'win_rate': self.wins / self.hedges if self.hedges else 0.0,
+            'hedge_delay': self.hedge_delay(),
+        }
@@ -1,45 +1,99 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from functools import partial
 from http import HTTPStatus
+import json
 import logging
 import os
+import signal
 import sys
+import threading
 import time
 
 from dotenv import load_dotenv
-from telegram import Bot
 import requests
 
-from bot_exceptions import HTTPRequestError, ServiceDeniedError
+from bot_exceptions import (APIOverloadError, HTTPRequestError,
+                            ServiceDeniedError)
+from bot_pool import bot_name, BotPool
+from clock import SystemClock
+from flight_recorder import FlightRecorder
+from health import serve_health, Watchdog
+from hedging import HedgedCaller
+from latency import LatencyTracker
+from limiter import AdaptiveLimiter
+from outbox import DeliveryWorker, ERROR_PRIORITY, Outbox, STATUS_PRIORITY
+from sinks import (check_destinations, FileSink, SMTPSink, TelegramSink,
+                   WebhookSink)
+from standby import Checkpoints, checkpoint_hook, Lease, run_standby
+from subscriptions import build_subscriptions, tenant_name
+from telegram_client import TelegramClient
 
 load_dotenv()
 
 PRACTICUM_TOKEN = os.getenv('YP_TOKEN')
 TELEGRAM_TOKEN = os.getenv('TG_TOKEN')
 TELEGRAM_CHAT_ID = os.getenv('CHAD_ID')
+SUBSCRIPTIONS = os.getenv('SUBSCRIPTIONS')
+OUTBOX_PATH = os.getenv('OUTBOX_PATH', __file__ + '.outbox.sqlite3')
+HEALTH_PORT = os.getenv('HEALTH_PORT')
+HEALTH_HOST = os.getenv('HEALTH_HOST', '127.0.0.1')
+CYCLE_BUDGET = int(os.getenv('CYCLE_BUDGET', 60))
+STALL_EXIT_AFTER = int(os.getenv('STALL_EXIT_AFTER', 0))
+HEDGE_REQUESTS = os.getenv('HEDGE_REQUESTS')
+HEDGE_PERCENTILE = float(os.getenv('HEDGE_PERCENTILE', 95))
+HEDGE_BUDGET = float(os.getenv('HEDGE_BUDGET', 0.05))
+NOTIFICATION_SLO = int(os.getenv('NOTIFICATION_SLO', 900))
+API_CONCURRENCY = int(os.getenv('API_CONCURRENCY', 4))
+API_MAX_CONCURRENCY = int(os.getenv('API_MAX_CONCURRENCY', 32))
+API_TIMEOUT = float(os.getenv('API_TIMEOUT', 30))
+STANDBY_LEASE_TTL = int(os.getenv('STANDBY_LEASE_TTL', 0))
+FLIGHT_RECORDER_PATH = os.getenv(
+    'FLIGHT_RECORDER_PATH', __file__ + '.flight'
+)
+FLIGHT_RECORDER_SLOTS = int(os.getenv('FLIGHT_RECORDER_SLOTS', 64))
+SINK_TIMEOUT = int(os.getenv('SINK_TIMEOUT', 10))
+SMTP_HOST = os.getenv('SMTP_HOST')
+SMTP_PORT = int(os.getenv('SMTP_PORT', 587))
+SMTP_USER = os.getenv('SMTP_USER')
+SMTP_PASSWORD = os.getenv('SMTP_PASSWORD')
+SMTP_FROM = os.getenv('SMTP_FROM', SMTP_USER)
+TELEGRAM_CLIENT = os.getenv('TELEGRAM_CLIENT')
+TELEGRAM_TOKENS = os.getenv('TG_TOKENS', '')
 TOKEN_NAMES = ('PRACTICUM_TOKEN', 'TELEGRAM_TOKEN', 'TELEGRAM_CHAT_ID')
 
 RETRY_TIME = 600
 ENDPOINT = 'https://practicum.yandex.ru/api/user_api/homework_statuses/'
-HEADERS = {'Authorization': f'OAuth {PRACTICUM_TOKEN}'}
+AUTHORIZATION = 'OAuth {token}'
+REDACTED_AUTHORIZATION = AUTHORIZATION.format(token='<redacted>')
 
 STATUS_CHANGED_MESSAGE = 'Изменился статус проверки работы "{name}". {verdict}'
+NOTIFICATION_KEY = '{destination}:{id}:{status}:{date_updated}'
+DATE_FORMAT = '%Y-%m-%dT%H:%M:%SZ'
 
-RESPONSE_INFO = 'Response from API: {response}'
 VERDICT_INFO = 'Verdict: {verdict}'
 
 BASE_ERROR_MESSAGE = ('An error occured when processing request to API:\n'
                       '{error}')
-BOT_ERROR_MESSAGE = ('An error occured when sending a message to the bot:\n'
-                     '{error}'
-                     'The following message was sent to the bot:\n{message}')
+SINK_ERROR_MESSAGE = ('An error occured when delivering a message '
+                      'to {sink}:{target}:\n{error}')
 TYPE_ERROR_MESSAGE = '{obj} is a {type}, when {expected_type} was expected'
 KEY_ERROR_MESSAGE = '{obj} does not have a key {key}'
 NO_VERDICT_MESSAGE = 'Received unrecognized status: {status}'
 TOKENS_MISSING_MESSAGE = 'One or more tokens are missing'
+OUTBOX_ERROR_MESSAGE = 'Could not queue an error message'
+SMTP_SENDER_MISSING_MESSAGE = ('SMTP_HOST is set, '
+                               'but neither SMTP_FROM nor SMTP_USER is')
+FLIGHT_DUMP_REASON = 'Dump requested by signal {signal}'
 TOKENS_LOGGING_MESSAGE = 'The following tokens are missing: {tokens}'
 CONNECTION_ERROR_MESSAGE = ('Connection error. '
                             'The following requst was sent:\n'
                             'url: {url}\nheaders: {headers}\n'
                             'params: {params}')
+TIMEOUT_ERROR_MESSAGE = ('The server did not answer in {timeout}s. '
+                         'The following requst was sent:\n'
+                         'url: {url}\nheaders: {headers}\n'
+                         'params: {params}')
 HTTP_ERROR_MESSAGE = ('The server responded with status code '
                       '[{response_code}]\n'
                       'The following requst was sent:\n'
@@ -58,54 +112,108 @@ HOMEWORK_VERDICTS = {
 
 
 def send_message(bot, message):
-    """Send a message to my chat."""
+    """Send a message to my chat the way the delivery workers do."""
+    return send_to_sink(
+        TelegramSink(bot, SINK_TIMEOUT), TELEGRAM_CHAT_ID, message
+    )
+
+
+def send_to_sink(sink, target, message):
+    """Deliver a message through the sink."""
     try:
-        bot.send_message(
-            chat_id=TELEGRAM_CHAT_ID,
-            text=message
-        )
+        sink.send(target, message)
     except Exception as error:
-        logging.exception(
-            BOT_ERROR_MESSAGE.format(error=error, message=message)
-        )
+        logging.exception(SINK_ERROR_MESSAGE.format(
+            sink=sink.name, target=target, error=error
+        ))
         return False
     return True
 
 
 def get_api_answer(current_timestamp):
     """Query the API for homework updates."""
+    return fetch_statuses(PRACTICUM_TOKEN, current_timestamp)
+
+
+def fetch_statuses(token, current_timestamp, recorder=None):
+    """Query the API for homework updates available to the token.
+
+    With a flight recorder, the raw answer is recorded before it is parsed.
+    """
     request_data = {
         'url': ENDPOINT,
-        'headers': HEADERS,
+        'headers': {'Authorization': AUTHORIZATION.format(token=token)},
         'params': {'from_date': current_timestamp},
+        'timeout': API_TIMEOUT,
     }
+    request_info = redacted(request_data)
+    started = time.time()
     try:
         response = requests.get(**request_data)
     except requests.exceptions.ConnectionError as error:
+        if recorder is not None:
+            record_exchange(
+                recorder, token, request_info, started, None, str(error)
+            )
         raise ConnectionError(
             CONNECTION_ERROR_MESSAGE.format(
-                error=error, **request_data
+                error=error, **request_info
             )
         )
+    except requests.exceptions.Timeout as error:
+        if recorder is not None:
+            record_exchange(
+                recorder, token, request_info, started, None, str(error)
+            )
+        raise TimeoutError(TIMEOUT_ERROR_MESSAGE.format(**request_info))
+    if recorder is not None:
+        record_exchange(
+            recorder, token, request_info, started, response.status_code,
+            response.content
+        )
     response_code = response.status_code
+    if (response_code == HTTPStatus.TOO_MANY_REQUESTS
+            or response_code >= HTTPStatus.INTERNAL_SERVER_ERROR):
+        raise APIOverloadError(
+            HTTP_ERROR_MESSAGE.format(
+                response_code=response_code, **request_info
+            )
+        )
     response_data = response.json()
     if 'error' in response_data or 'code' in response_data:
         errors = response_data.get('error')
         code = response_data.get('code')
         raise ServiceDeniedError(
             HTTP_DENIED_MESSAGE.format(
-                code=code, errors=errors, **request_data
+                code=code, errors=errors, **request_info
             )
         )
     if response_code != HTTPStatus.OK:
         raise HTTPRequestError(
             HTTP_ERROR_MESSAGE.format(
-                response_code=response_code, **request_data
+                response_code=response_code, **request_info
             )
         )
     return response_data
 
 
+def redacted(request_data):
+    """Return the request data with the token hidden, fit to be shown."""
+    return {
+        **request_data, 'headers': {'Authorization': REDACTED_AUTHORIZATION}
+    }
+
+
+def record_exchange(recorder, token, request_info, started, status, body):
+    """Record an API exchange, given the redacted request data."""
+    if isinstance(body, str):
+        body = body.encode()
+    recorder.record(
+        tenant_name(token), request_info,
+        status, started, time.time() - started, body
+    )
+
+
 def check_response(response):
     """Check that the response data is correct."""
     if not isinstance(response, dict):
@@ -144,6 +252,16 @@ def parse_status(homework):
     )
 
 
+def updated_at(homework):
+    """Return when the homework status changed as a timestamp, if known."""
+    try:
+        return datetime.strptime(
+            homework['date_updated'], DATE_FORMAT
+        ).replace(tzinfo=timezone.utc).timestamp()
+    except (KeyError, TypeError, ValueError):
+        return None
+
+
 def check_tokens():
     """Check that all the required tokens are in place."""
     missing = [name for name in TOKEN_NAMES if not globals()[name]]
@@ -153,44 +271,237 @@ def check_tokens():
     return True
 
 
-def main():
-    """Program's entry point."""
-    if not check_tokens():
-        raise NameError(TOKENS_MISSING_MESSAGE)
-    bot = Bot(token=TELEGRAM_TOKEN)
-    last_message = None
-    last_homework = None
-    current_timestamp = int(time.time())
+def load_subscriptions():
+    """Subscribe the main chat and any destinations in SUBSCRIPTIONS."""
+    spec = {PRACTICUM_TOKEN: [TELEGRAM_CHAT_ID]}
+    if SUBSCRIPTIONS:
+        for token, destinations in json.loads(SUBSCRIPTIONS).items():
+            spec.setdefault(token, []).extend(destinations)
+    return build_subscriptions(spec)
 
-    while True:
+
+def make_bot(token):
+    """Create a Telegram bot, the built-in client if asked or if needed.
+
+    python-telegram-bot is only imported when it is going to be used.
+    """
+    if TELEGRAM_CLIENT != 'lite':
         try:
-            response = get_api_answer(current_timestamp)
-            logging.debug(RESPONSE_INFO.format(response=response))
-            homeworks = check_response(response)
-            if not homeworks:
-                continue
-            homework = homeworks[0]
-            message = parse_status(homework)
-            logging.debug(VERDICT_INFO.format(verdict=message))
-
-            if last_message and homework['id'] != last_homework:
-                message = last_message
-            elif message == last_message:
-                continue
-            if send_message(bot, message):
-                last_message = message
-                last_homework = homework['id']
-                current_timestamp = response.get(
-                    'current_date', current_timestamp
+            from telegram import Bot
+        except ImportError:
+            pass
+        else:
+            return Bot(token=token)
+    return TelegramClient(token)
+
+
+def load_bots(clock):
+    """Pool the main bot with the extra bots listed in TG_TOKENS."""
+    tokens = dict.fromkeys(
+        token for token in [TELEGRAM_TOKEN, *TELEGRAM_TOKENS.split(',')]
+        if token
+    )
+    return BotPool(
+        [(bot_name(token), make_bot(token)) for token in tokens], clock
+    )
+
+
+def load_sinks(bot):
+    """Set up every sink destinations can refer to.
+
+    Raises ValueError if the SMTP sink is configured without a sender.
+    """
+    sinks = {
+        sink.name: sink for sink in (
+            TelegramSink(bot, SINK_TIMEOUT),
+            WebhookSink(SINK_TIMEOUT),
+            FileSink(SINK_TIMEOUT),
+        )
+    }
+    if SMTP_HOST:
+        if not SMTP_FROM:
+            raise ValueError(SMTP_SENDER_MISSING_MESSAGE)
+        sinks[SMTPSink.name] = SMTPSink(
+            SMTP_HOST, SMTP_PORT, SMTP_FROM, SMTP_USER, SMTP_PASSWORD,
+            SINK_TIMEOUT
+        )
+    return sinks
+
+
+def start_delivery(outbox, sinks, clock, listeners, watchdog):
+    """Start a delivery worker per sink so sinks never wait for each other."""
+    for name, sink in sinks.items():
+        worker = DeliveryWorker(
+            outbox, partial(send_to_sink, sink), clock,
+            listeners=listeners, sink=name
+        )
+        watchdog.metrics[f'sink.{name}'] = worker.metrics
+        threading.Thread(
+            target=worker.run, name=f'delivery-{name}', daemon=True
+        ).start()
+
+
+def notify(outbox, subscription, homework, message):
+    """Queue the status message for every subscribed destination."""
+    for subscriber in subscription.subscribers:
+        if message == subscriber.last_message:
+            continue
+        outbox.enqueue(
+            subscriber.target, message,
+            key=NOTIFICATION_KEY.format(
+                destination=subscriber.destination, id=homework['id'],
+                status=homework['status'],
+                date_updated=homework.get('date_updated')
+            ),
+            priority=STATUS_PRIORITY,
+            tenant=subscription.tenant,
+            date_updated=updated_at(homework),
+            sink=subscriber.sink
+        )
+        subscriber.last_message = message
+
+
+def report_error(outbox, subscription, error):
+    """Queue an error message for every subscribed destination once."""
+    message = BASE_ERROR_MESSAGE.format(error=error)
+    logging.error(message)
+    try:
+        for subscriber in subscription.subscribers:
+            if message != subscriber.last_message:
+                outbox.enqueue(
+                    subscriber.target, message, priority=ERROR_PRIORITY,
+                    tenant=subscription.tenant, sink=subscriber.sink
                 )
+                subscriber.last_message = message
+    except Exception:
+        logging.exception(OUTBOX_ERROR_MESSAGE)
+
+
+def poll_subscription(outbox, subscription, fetch, watchdog):
+    """Fetch the token's updates once and queue notifications."""
+    timestamp = subscription.timestamp
+    try:
+        response = fetch(subscription.token, timestamp)
+        watchdog.fetch_succeeded(subscription.tenant)
+        homeworks = check_response(response)
+        if not homeworks:
+            watchdog.payload_accepted(subscription.tenant)
+            return
+        homework = homeworks[0]
+        message = parse_status(homework)
+        watchdog.payload_accepted(subscription.tenant)
+        logging.debug(VERDICT_INFO.format(verdict=message))
+        notify(outbox, subscription, homework, message)
+        subscription.timestamp = response.get('current_date', timestamp)
+    except (KeyError, TypeError, ValueError) as error:
+        watchdog.payload_rejected(subscription.tenant, error)
+        report_error(outbox, subscription, error)
+    except Exception as error:
+        report_error(outbox, subscription, error)
+
 
-        except Exception as error:
-            message = BASE_ERROR_MESSAGE.format(error=error)
-            logging.error(message)
-            if message != last_message and send_message(bot, message):
-                last_message = message
-        finally:
-            time.sleep(RETRY_TIME)
+def poll(outbox, subscriptions, clock, fetch=fetch_statuses, watchdog=None,
+         executor=None, on_cycle=None):
+    """Query the API and queue notifications until interrupted.
+
+    Subscriptions are polled concurrently on the executor if one is given;
+    each one has its own token, so no token is fetched twice in a cycle.
+    Subscriptions without a restored timestamp start from now.
+    on_cycle(subscriptions) is called before and after every cycle.
+    """
+    watchdog = watchdog or Watchdog(clock, subscriptions)
+    run = executor.map if executor else map
+    on_cycle = on_cycle or (lambda subscriptions: None)
+    for subscription in subscriptions:
+        if subscription.timestamp is None:
+            subscription.timestamp = int(clock.time())
+
+    while True:
+        on_cycle(subscriptions)
+        watchdog.cycle_start()
+        list(run(
+            lambda subscription: poll_subscription(
+                outbox, subscription, fetch, watchdog
+            ),
+            subscriptions
+        ))
+        watchdog.cycle_end(RETRY_TIME)
+        on_cycle(subscriptions)
+        clock.sleep(RETRY_TIME)
+
+
+def make_fetch(watchdog):
+    """Wrap fetch_statuses into the concurrency limit and hedging.
+
+    Answers are recorded into the watchdog's flight recorder.
+    """
+    limiter = AdaptiveLimiter(API_CONCURRENCY, maximum=API_MAX_CONCURRENCY)
+    watchdog.metrics['api_concurrency'] = limiter.metrics
+    fetch = partial(fetch_statuses, recorder=watchdog.recorder)
+    if not HEDGE_REQUESTS:
+        return partial(limiter.call, fetch)
+    fetch = HedgedCaller(
+        fetch, percentile=HEDGE_PERCENTILE, budget=HEDGE_BUDGET,
+        workers=2 * API_MAX_CONCURRENCY, limiter=limiter
+    )
+    watchdog.metrics['hedging'] = fetch.metrics
+    return fetch
+
+
+def main():
+    """Program's entry point."""
+    if not check_tokens():
+        raise NameError(TOKENS_MISSING_MESSAGE)
+    clock = SystemClock()
+    bots = load_bots(clock)
+    bots.check()
+    subscriptions = load_subscriptions()
+    sinks = load_sinks(bots)
+    for subscription in subscriptions:
+        check_destinations(sinks, (
+            subscriber.destination for subscriber in subscription.subscribers
+        ))
+    watchdog = Watchdog(
+        clock, subscriptions, cycle_budget=CYCLE_BUDGET,
+        exit_after=STALL_EXIT_AFTER,
+        recorder=FlightRecorder(FLIGHT_RECORDER_PATH, FLIGHT_RECORDER_SLOTS),
+        dump_directory=os.path.dirname(os.path.abspath(FLIGHT_RECORDER_PATH))
+    )
+    signal.signal(signal.SIGUSR1, lambda signum, frame: watchdog.dump_flight(
+        FLIGHT_DUMP_REASON.format(signal=signal.Signals(signum).name)
+    ))
+    watchdog.metrics['bots'] = bots.metrics
+    tracker = LatencyTracker(NOTIFICATION_SLO)
+    watchdog.metrics['latency'] = tracker.report
+    outbox = Outbox(OUTBOX_PATH, clock)
+    start_delivery(
+        outbox, sinks, clock,
+        [watchdog.delivery_succeeded, tracker.record], watchdog
+    )
+    threading.Thread(target=watchdog.run, daemon=True).start()
+    fetch = make_fetch(watchdog)
+    if HEALTH_PORT:
+        serve_health(watchdog, int(HEALTH_PORT), HEALTH_HOST)
+    checkpoints = Checkpoints(OUTBOX_PATH, clock)
+    checkpoints.restore(subscriptions)
+    lease = None
+    if STANDBY_LEASE_TTL:
+        lease = Lease(OUTBOX_PATH, clock, ttl=STANDBY_LEASE_TTL)
+    with ThreadPoolExecutor(
+        API_MAX_CONCURRENCY, thread_name_prefix='poll'
+    ) as executor:
+        active = partial(
+            poll, outbox, subscriptions, clock, fetch, watchdog, executor,
+            checkpoint_hook(checkpoints, lease)
+        )
+        if lease is None:
+            active()
+        else:
+            run_standby(
+                lease, clock, active,
+                partial(checkpoints.restore, subscriptions),
+                healthy=watchdog.live, idle=watchdog.idle
+            )
 
 
 if __name__ == '__main__':
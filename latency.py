@@ -0,0 +1,106 @@
+from collections import Counter, defaultdict, deque
+import logging
+import threading
+
+WINDOW_SIZE = 200
+NOTIFICATION_SLO = 900
+PERCENTILES = (50, 95, 99)
+STAGES = ('detection', 'queue', 'send', 'total')
+
+SLO_VIOLATION_MESSAGE = ('Notification {id} for tenant {tenant} took '
+                         '{total:.1f}s from date_updated, SLO is {slo}s')
+
+
+class LatencyWindow:
+    """Durations of the most recent calls."""
+
+    def __init__(self, size=WINDOW_SIZE):
+        """Keep at most `size` durations."""
+        self._samples = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def add(self, seconds):
+        """Record a call duration."""
+        with self._lock:
+            self._samples.append(seconds)
+
+    def __len__(self):
+        """Return the number of recorded durations."""
+        return len(self._samples)
+
+    def percentile(self, percent):
+        """Return the given percentile of recorded durations."""
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return None
+        index = min(len(samples) - 1, int(len(samples) * percent / 100))
+        return samples[index]
+
+
+class LatencyTracker:
+    """Rolling end-to-end notification latency per tenant and overall.
+
+    Latency of a delivered notification is split into stages:
+    detection (date_updated to enqueue), queue (enqueue to send),
+    send (send to acknowledgement) and total. Notifications without
+    date_updated, like error reports, are not tracked.
+    """
+
+    def __init__(self, slo=NOTIFICATION_SLO, size=WINDOW_SIZE):
+        """Track latencies against the SLO in seconds."""
+        self.slo = slo
+        self._windows = defaultdict(lambda: LatencyWindow(size))
+        self.delivered = Counter()
+        self.violations = Counter()
+        self._lock = threading.Lock()
+
+    def record(self, notification, sent, delivered):
+        """Record a delivered notification; meant as a worker listener."""
+        if notification.date_updated is None:
+            return
+        stages = {
+            'detection': notification.created - notification.date_updated,
+            'queue': sent - notification.created,
+            'send': delivered - sent,
+            'total': delivered - notification.date_updated,
+        }
+        scopes = ('global', notification.tenant)
+        with self._lock:
+            for scope in scopes:
+                self.delivered[scope] += 1
+                for stage, seconds in stages.items():
+                    self._windows[scope, stage].add(seconds)
+            if stages['total'] > self.slo:
+                for scope in scopes:
+                    self.violations[scope] += 1
+        if stages['total'] > self.slo:
+            logging.warning(SLO_VIOLATION_MESSAGE.format(
+                id=notification.id, tenant=notification.tenant,
+                total=stages['total'], slo=self.slo
+            ))
+
+    def _scope_report(self, scope):
+        report = {
+            'delivered': self.delivered[scope],
+            'slo_violations': self.violations[scope],
+        }
+        for stage in STAGES:
+            window = self._windows[scope, stage]
+            report[stage] = {
+                f'p{percent}': window.percentile(percent)
+                for percent in PERCENTILES
+            }
+        return report
+
+    def report(self):
+        """Return percentiles and SLO violations, globally and by tenant."""
+        with self._lock:
+            tenants = [scope for scope in self.delivered if scope != 'global']
+            return {
+                'slo': self.slo,
+                'global': self._scope_report('global'),
+                'tenants': {
+                    tenant: self._scope_report(tenant) for tenant in tenants
+                },
+            }
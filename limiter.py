@@ -0,0 +1,132 @@
+import logging
+import threading
+import time
+
+import requests
+
+from bot_exceptions import APIOverloadError
+from latency import LatencyWindow
+
+INITIAL_LIMIT = 4
+MIN_LIMIT = 1
+MAX_LIMIT = 32
+BACKOFF = 0.5
+TOLERANCE = 2.0
+BASELINE_WEIGHT = 0.05
+RECENT_WEIGHT = 0.2
+OVERLOAD_ERRORS = (
+    APIOverloadError, ConnectionError, TimeoutError,
+    requests.exceptions.ConnectionError, requests.exceptions.Timeout,
+)
+
+LIMIT_DECREASED_MESSAGE = 'Concurrency limit lowered to {limit:.1f}: {reason}'
+
+
+def smooth(average, sample, weight):
+    """Return the exponentially weighted moving average with the sample."""
+    if average is None:
+        return sample
+    return average + weight * (sample - average)
+
+
+class AdaptiveLimiter:
+    """AIMD limit on the number of concurrent calls.
+
+    Latency of successful calls is averaged twice: slowly into a
+    baseline and quickly into the recent latency. Each success raises
+    the limit by about one per limit's worth of calls. An overload
+    error, or recent latency over `tolerance` times the baseline,
+    multiplies the limit by `backoff` - at most once per window:
+    calls which were in flight at a decrease cannot cause another one.
+    Calls over the limit wait for a free slot.
+    """
+
+    def __init__(self, initial=INITIAL_LIMIT, minimum=MIN_LIMIT,
+                 maximum=MAX_LIMIT, backoff=BACKOFF, tolerance=TOLERANCE,
+                 overload_errors=OVERLOAD_ERRORS):
+        """Start at `initial` concurrent calls."""
+        self.limit = float(initial)
+        self.minimum = minimum
+        self.maximum = maximum
+        self.backoff = backoff
+        self.tolerance = tolerance
+        self.overload_errors = overload_errors
+        self.in_flight = 0
+        self.decreases = 0
+        self.baseline = None
+        self.recent = None
+        self._exempt = 0
+        self.latency = LatencyWindow()
+        self.queue_delay = LatencyWindow()
+        self._available = threading.Condition()
+
+    def acquire(self):
+        """Wait for a free slot under the current limit."""
+        started = time.perf_counter()
+        with self._available:
+            while self.in_flight >= int(self.limit):
+                self._available.wait()
+            self.in_flight += 1
+        self.queue_delay.add(time.perf_counter() - started)
+
+    def release(self, latency, error=None):
+        """Free the slot and adjust the limit by the call's outcome."""
+        if error is None:
+            self.latency.add(latency)
+        with self._available:
+            if error is None:
+                self.baseline = smooth(
+                    self.baseline, latency, BASELINE_WEIGHT
+                )
+                self.recent = smooth(self.recent, latency, RECENT_WEIGHT)
+            if isinstance(error, self.overload_errors):
+                reason = type(error).__name__
+            elif (error is None
+                    and self.recent > self.baseline * self.tolerance):
+                reason = 'latency {:.3f}s over {:.3f}s'.format(
+                    self.recent, self.baseline
+                )
+            else:
+                reason = None
+            self.in_flight -= 1
+            exempt = self._exempt > 0
+            self._exempt = max(self._exempt - 1, 0)
+            if reason and not exempt:
+                self.limit = max(self.minimum, self.limit * self.backoff)
+                self.decreases += 1
+                self._exempt = self.in_flight
+            elif reason is None and error is None:
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
+            else:
+                reason = None
+            limit = self.limit
+            self._available.notify_all()
+        if reason:
+            logging.info(LIMIT_DECREASED_MESSAGE.format(
+                limit=limit, reason=reason
+            ))
+
+    def call(self, func, *args):
+        """Call func(*args) once a slot is free."""
+        self.acquire()
+        started = time.perf_counter()
+        try:
+            result = func(*args)
+        except Exception as error:
+            self.release(time.perf_counter() - started, error)
+            raise
+        self.release(time.perf_counter() - started)
+        return result
+
+    def metrics(self):
+        """Return the current limit, load and queueing delay."""
+        return {
+            'limit': round(self.limit, 2),
+            'in_flight': self.in_flight,
+            'decreases': self.decreases,
+            'queue_delay_p50': self.queue_delay.percentile(50),
+            'queue_delay_p95': self.queue_delay.percentile(95),
+            'latency_p50': self.latency.percentile(50),
+            'latency_baseline': self.baseline,
+            'latency_recent': self.recent,
+        }
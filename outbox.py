@@ -0,0 +1,280 @@
+from collections import namedtuple
+import logging
+import sqlite3
+import threading
+
+from sinks import DEFAULT_SINK
+
+STATUS_PRIORITY = 0
+ERROR_PRIORITY = 1
+DELIVERY_INTERVAL = 5
+RETRY_BACKOFF = 5
+RETRY_BACKOFF_LIMIT = 600
+BATCH_SIZE = 100
+CLAIM_TIMEOUT = 60
+MAX_ATTEMPTS = 30
+RETENTION = 7 * 24 * 60 * 60
+PRUNE_INTERVAL = 60 * 60
+
+DELIVERY_RETRY_MESSAGE = ('Delivery of notification {id} to {sink}:{target} '
+                          'failed, attempt {attempts}, next in {delay}s')
+DELIVERY_DEAD_MESSAGE = ('Giving up on notification {id} to {sink}:{target} '
+                         'after {attempts} attempts')
+WORKER_ERROR_MESSAGE = 'Delivery worker failed to drain the outbox'
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS outbox (
+    id INTEGER PRIMARY KEY,
+    key TEXT UNIQUE,
+    chat_id TEXT NOT NULL,
+    text TEXT NOT NULL,
+    priority INTEGER NOT NULL,
+    attempts INTEGER NOT NULL DEFAULT 0,
+    created REAL NOT NULL,
+    next_attempt REAL NOT NULL,
+    delivered REAL,
+    tenant TEXT,
+    date_updated REAL,
+    sent REAL,
+    sink TEXT,
+    dead REAL
+);
+CREATE INDEX IF NOT EXISTS outbox_pending
+    ON outbox (delivered, priority, next_attempt);
+'''
+MIGRATIONS = {
+    'tenant': 'ALTER TABLE outbox ADD COLUMN tenant TEXT',
+    'date_updated': 'ALTER TABLE outbox ADD COLUMN date_updated REAL',
+    'sent': 'ALTER TABLE outbox ADD COLUMN sent REAL',
+    'sink': 'ALTER TABLE outbox ADD COLUMN sink TEXT',
+    'dead': 'ALTER TABLE outbox ADD COLUMN dead REAL',
+}
+
+Notification = namedtuple(
+    'Notification',
+    'id sink target text attempts tenant date_updated created'
+)
+
+
+class Outbox:
+    """Durable queue of rendered notifications kept in SQLite.
+
+    Notifications with the same key are only queued once, so
+    re-enqueueing after a restart never produces a second message.
+    Notifications without a key are always queued.
+    Delivered rows, keys included, are pruned after a retention period:
+    a key only guards against re-enqueueing a status change found again
+    after a restart, and polling resumes from a checkpoint at most
+    a few cycles old.
+    The chat_id column holds the target of any sink, rows queued
+    before sinks existed have no sink and belong to Telegram.
+    """
+
+    def __init__(self, path, clock):
+        """Open or create the outbox in the SQLite file at path."""
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(
+            path, check_same_thread=False, isolation_level=None
+        )
+        self._db.execute('PRAGMA journal_mode=WAL')
+        self._db.execute('PRAGMA synchronous=NORMAL')
+        self._db.executescript(SCHEMA)
+        self._migrate()
+
+    def _migrate(self):
+        columns = {
+            row[1] for row in self._db.execute('PRAGMA table_info(outbox)')
+        }
+        for column, statement in MIGRATIONS.items():
+            if column not in columns:
+                self._db.execute(statement)
+
+    def enqueue(self, target, text, key=None, priority=STATUS_PRIORITY,
+                tenant=None, date_updated=None, sink=DEFAULT_SINK):
+        """Queue a message; return False if its key was queued before.
+
+        date_updated is when the change being reported happened,
+        it is kept to measure end-to-end latency.
+        """
+        now = self.clock.time()
+        with self._lock:
+            cursor = self._db.execute(
+                'INSERT OR IGNORE INTO outbox '
+                '(key, chat_id, text, priority, created, next_attempt, '
+                'tenant, date_updated, sink) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                (key, str(target), text, priority, now, now,
+                 tenant, date_updated, sink)
+            )
+        return cursor.rowcount == 1
+
+    def due(self, sink=None, limit=BATCH_SIZE):
+        """Return undelivered messages whose retry time has come.
+
+        Only messages for the given sink are returned unless it is None.
+        """
+        with self._lock:
+            rows = self._db.execute(
+                'SELECT id, COALESCE(sink, ?), chat_id, text, attempts, '
+                'tenant, date_updated, created FROM outbox '
+                'WHERE delivered IS NULL AND dead IS NULL '
+                'AND next_attempt <= ? '
+                'AND (? IS NULL OR COALESCE(sink, ?) = ?) '
+                'ORDER BY priority, id LIMIT ?',
+                (DEFAULT_SINK, self.clock.time(),
+                 sink, DEFAULT_SINK, sink, limit)
+            ).fetchall()
+        return [Notification(*row) for row in rows]
+
+    def claim(self, message_id, timeout=CLAIM_TIMEOUT):
+        """Reserve a due message for delivery; return False if it is taken.
+
+        Other workers, in this process or another one sharing the file,
+        will not see the message until the claim times out.
+        """
+        now = self.clock.time()
+        with self._lock:
+            cursor = self._db.execute(
+                'UPDATE outbox SET next_attempt = ? WHERE id = ? '
+                'AND delivered IS NULL AND dead IS NULL '
+                'AND next_attempt <= ?',
+                (now + timeout, message_id, now)
+            )
+        return cursor.rowcount == 1
+
+    def ack(self, message_id, sent=None):
+        """Mark a message as delivered, sent is when sending started."""
+        with self._lock:
+            self._db.execute(
+                'UPDATE outbox SET delivered = ?, sent = ? WHERE id = ?',
+                (self.clock.time(), sent, message_id)
+            )
+
+    def retry(self, message_id, delay):
+        """Put a message back for another attempt after delay seconds."""
+        with self._lock:
+            self._db.execute(
+                'UPDATE outbox SET attempts = attempts + 1, '
+                'next_attempt = ? WHERE id = ?',
+                (self.clock.time() + delay, message_id)
+            )
+
+    def bury(self, message_id):
+        """Give up on a message; it is kept until pruned, never retried."""
+        with self._lock:
+            self._db.execute(
+                'UPDATE outbox SET attempts = attempts + 1, dead = ? '
+                'WHERE id = ?',
+                (self.clock.time(), message_id)
+            )
+
+    def prune(self, retention=RETENTION, sink=None):
+        """Delete messages delivered or given up over `retention` seconds ago.
+
+        Only messages for the given sink are deleted unless it is None.
+        Returns the number of deleted messages.
+        """
+        with self._lock:
+            cursor = self._db.execute(
+                'DELETE FROM outbox WHERE COALESCE(delivered, dead) < ? '
+                'AND (? IS NULL OR COALESCE(sink, ?) = ?)',
+                (self.clock.time() - retention, sink, DEFAULT_SINK, sink)
+            )
+        return cursor.rowcount
+
+    def pending(self):
+        """Return the number of undelivered messages."""
+        with self._lock:
+            return self._db.execute(
+                'SELECT COUNT(*) FROM outbox '
+                'WHERE delivered IS NULL AND dead IS NULL'
+            ).fetchone()[0]
+
+
+class DeliveryWorker:
+    """Drain the outbox independently of the polling loop.
+
+    A worker serves a single sink, or every sink when sink is None,
+    so a slow sink cannot hold up deliveries to the others.
+    send(target, text) must return True once the message is delivered;
+    failed messages are retried with exponential backoff, up to
+    `max_attempts` attempts in all; then the message is given up on.
+    Each listener is called as listener(notification, sent, delivered)
+    with the moments sending started and finished.
+    Delivered messages are pruned every PRUNE_INTERVAL seconds.
+    """
+
+    def __init__(self, outbox, send, clock, interval=DELIVERY_INTERVAL,
+                 listeners=(), sink=None, retention=RETENTION,
+                 max_attempts=MAX_ATTEMPTS):
+        """Deliver the outbox through send every `interval` seconds."""
+        self.outbox = outbox
+        self.send = send
+        self.clock = clock
+        self.interval = interval
+        self.listeners = list(listeners)
+        self.sink = sink
+        self.retention = retention
+        self.max_attempts = max_attempts
+        self.delivered = 0
+        self.failed = 0
+        self.pruned = 0
+        self.dead = 0
+        self._prune_at = clock.time()
+
+    def run_once(self):
+        """Attempt every message that is due; return the number delivered."""
+        if self.clock.time() >= self._prune_at:
+            self.pruned += self.outbox.prune(self.retention, self.sink)
+            self._prune_at = self.clock.time() + PRUNE_INTERVAL
+        delivered = 0
+        for notification in self.outbox.due(self.sink):
+            if not self.outbox.claim(notification.id):
+                continue
+            sent = self.clock.time()
+            if self.send(notification.target, notification.text):
+                self.outbox.ack(notification.id, sent)
+                delivered += 1
+                acked = self.clock.time()
+                for listener in self.listeners:
+                    listener(notification, sent, acked)
+                continue
+            self.failed += 1
+            if notification.attempts + 1 >= self.max_attempts:
+                self.dead += 1
+                logging.error(DELIVERY_DEAD_MESSAGE.format(
+                    id=notification.id, sink=notification.sink,
+                    target=notification.target,
+                    attempts=notification.attempts + 1
+                ))
+                self.outbox.bury(notification.id)
+                continue
+            delay = min(
+                RETRY_BACKOFF * 2 ** notification.attempts,
+                RETRY_BACKOFF_LIMIT
+            )
+            logging.warning(DELIVERY_RETRY_MESSAGE.format(
+                id=notification.id, sink=notification.sink,
+                target=notification.target,
+                attempts=notification.attempts + 1, delay=delay
+            ))
+            self.outbox.retry(notification.id, delay)
+        self.delivered += delivered
+        return delivered
+
+    def metrics(self):
+        """Return delivered, failed attempt, dead and pruned counters."""
+        return {
+            'delivered': self.delivered, 'failed': self.failed,
+            'dead': self.dead, 'pruned': self.pruned,
+        }
+
+    def run(self):
+        """Deliver forever; meant to be the target of a daemon thread."""
+        while True:
+            try:
+                self.run_once()
+            except Exception:
+                logging.exception(WORKER_ERROR_MESSAGE)
+            self.clock.sleep(self.interval)
@@ -0,0 +1,177 @@
+from collections import Counter
+from datetime import datetime, timezone
+from functools import partial
+
+from clock import VirtualClock
+from health import Watchdog
+import homework
+from latency import LatencyTracker
+from outbox import DeliveryWorker, Outbox
+from sinks import TelegramSink
+from standby import checkpoint_hook
+from subscriptions import build_subscriptions
+
+SIMULATION_START = 1_600_000_000
+SIMULATION_TOKEN = 'token'
+SIMULATION_CHAT = 'chat'
+DELIVERY_INTERVAL = 60
+CHECK_INTERVAL = 30
+BOT_OUTAGE_MESSAGE = 'Telegram is unavailable'
+API_OUTAGE_MESSAGE = 'Practicum API is unavailable'
+
+
+class SimulationFinished(BaseException):
+    """Virtual time reached the end of the simulation."""
+
+    pass
+
+
+class Restart(BaseException):
+    """Simulated crash of the worker process."""
+
+    pass
+
+
+def isoformat(timestamp):
+    """Render a virtual timestamp the way Practicum does."""
+    return datetime.fromtimestamp(timestamp, timezone.utc).strftime(
+        homework.DATE_FORMAT
+    )
+
+
+class ScriptedAPI:
+    """Practicum API stand-in replaying a scripted timeline.
+
+    Homework statuses become visible at the moment they were scripted,
+    requests made during an outage window raise the scripted error.
+    """
+
+    def __init__(self, clock):
+        """Answer on the given clock."""
+        self.clock = clock
+        self.calls = Counter()
+        self._updates = []
+        self._outages = []
+        self._hangs = []
+
+    def set_status(self, when, homework_id, status, name=None):
+        """Change a homework status at the given virtual moment."""
+        self._updates.append((when, {
+            'id': homework_id,
+            'status': status,
+            'homework_name': name or f'hw{homework_id}',
+            'date_updated': isoformat(when),
+        }))
+        self._updates.sort(key=lambda update: update[0])
+
+    def outage(self, start, end, error=ConnectionError):
+        """Fail every request made between start and end."""
+        self._outages.append((start, end, error))
+
+    def hang(self, start, end, seconds):
+        """Make requests made between start and end take this long."""
+        self._hangs.append((start, end, seconds))
+
+    def __call__(self, token, current_timestamp):
+        """Answer the way fetch_statuses would."""
+        self.calls[token] += 1
+        now = self.clock.time()
+        for start, end, seconds in self._hangs:
+            if start <= now < end:
+                self.clock.sleep(seconds)
+        for start, end, error in self._outages:
+            if start <= now < end:
+                raise error(API_OUTAGE_MESSAGE)
+        latest = {}
+        for when, homework_data in self._updates:
+            if current_timestamp <= when <= now:
+                latest[homework_data['id']] = (when, homework_data)
+        homeworks = [
+            homework_data for _, homework_data in sorted(
+                latest.values(), key=lambda item: item[0], reverse=True
+            )
+        ]
+        return {'homeworks': homeworks, 'current_date': int(now)}
+
+
+class ScriptedBot:
+    """Telegram bot stand-in recording every delivered message."""
+
+    def __init__(self, clock):
+        """Record messages on the given clock."""
+        self.clock = clock
+        self.sent = []
+        self._outages = []
+
+    def outage(self, start, end, chat_id=None):
+        """Fail messages sent between start and end to the chat or to all."""
+        self._outages.append((start, end, chat_id))
+
+    def send_message(self, chat_id, text, **kwargs):
+        """Deliver a message unless Telegram is scripted to be down."""
+        now = self.clock.time()
+        for start, end, failing_chat in self._outages:
+            if start <= now < end and failing_chat in (None, chat_id):
+                raise ConnectionError(BOT_OUTAGE_MESSAGE)
+        self.sent.append((now, chat_id, text))
+
+
+def _finish():
+    raise SimulationFinished
+
+
+def _restart():
+    raise Restart
+
+
+def simulate(api, bot, until, restarts=(), spec=None, outbox=None,
+             watchdog=None, tracker=None, sinks=None, checkpoints=None,
+             delivery_interval=DELIVERY_INTERVAL,
+             check_interval=CHECK_INTERVAL):
+    """Run the polling loop on the API's clock until the given moment.
+
+    spec maps tokens to destinations the way SUBSCRIPTIONS does.
+    Telegram messages go to the bot, other sinks can be passed by name.
+    With checkpoints, every restart resumes from the last saved state.
+    The outbox, watchdog and latency tracker outlive restarts, every restart
+    discards the loop state the same way a process restart would.
+    Returns the number of completed poll cycles.
+    """
+    clock = api.clock
+    spec = spec or {SIMULATION_TOKEN: [SIMULATION_CHAT]}
+    outbox = outbox or Outbox(':memory:', clock)
+    watchdog = watchdog or Watchdog(clock)
+    tracker = tracker or LatencyTracker()
+    sinks = {TelegramSink.name: TelegramSink(bot), **(sinks or {})}
+    for name, sink in sinks.items():
+        worker = DeliveryWorker(
+            outbox, partial(homework.send_to_sink, sink), clock,
+            listeners=[watchdog.delivery_succeeded, tracker.record],
+            sink=name
+        )
+        clock.call_every(delivery_interval, worker.run_once)
+    clock.call_every(check_interval, watchdog.check)
+    clock.call_at(until, _finish)
+    for when in restarts:
+        clock.call_at(when, _restart)
+    on_cycle = checkpoints and checkpoint_hook(checkpoints)
+    while True:
+        subscriptions = build_subscriptions(spec)
+        watchdog.subscriptions = subscriptions
+        if checkpoints:
+            checkpoints.restore(subscriptions)
+        try:
+            homework.poll(
+                outbox, subscriptions, clock, api, watchdog,
+                on_cycle=on_cycle
+            )
+        except Restart:
+            continue
+        except SimulationFinished:
+            return watchdog.cycles
+
+
+def make_simulation(start=SIMULATION_START):
+    """Return a fresh virtual clock with API and bot stand-ins on it."""
+    clock = VirtualClock(start)
+    return ScriptedAPI(clock), ScriptedBot(clock)
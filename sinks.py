@@ -0,0 +1,138 @@
+from abc import ABC, abstractmethod
+from concurrent.futures import Future
+from email.message import EmailMessage
+import smtplib
+import threading
+
+import requests
+
+SINK_TIMEOUT = 10
+DEFAULT_SINK = 'telegram'
+EMAIL_SUBJECT = 'Homework status update'
+
+UNKNOWN_SINK_MESSAGE = 'Destination {destination} uses unknown sink {sink}'
+
+
+class Sink(ABC):
+    """Destination kind that notifications can be delivered to.
+
+    send(target, text) raises on failure and must give up
+    after `timeout` seconds.
+    """
+
+    name = None
+
+    def __init__(self, timeout=SINK_TIMEOUT):
+        """Give up on a delivery after `timeout` seconds."""
+        self.timeout = timeout
+
+    @abstractmethod
+    def send(self, target, text):
+        """Deliver text to the target."""
+
+
+class TelegramSink(Sink):
+    """Send messages to Telegram chats through a bot."""
+
+    name = 'telegram'
+
+    def __init__(self, bot, timeout=SINK_TIMEOUT):
+        """Send through the bot."""
+        super().__init__(timeout)
+        self.bot = bot
+
+    def send(self, target, text):
+        """Send text to the chat."""
+        self.bot.send_message(chat_id=target, text=text, timeout=self.timeout)
+
+
+class WebhookSink(Sink):
+    """POST messages as JSON to a URL."""
+
+    name = 'webhook'
+
+    def __init__(self, timeout=SINK_TIMEOUT):
+        """Reuse connections between deliveries."""
+        super().__init__(timeout)
+        self.session = requests.Session()
+
+    def send(self, target, text):
+        """POST {"text": text} to the URL."""
+        response = self.session.post(
+            target, json={'text': text}, timeout=self.timeout
+        )
+        response.raise_for_status()
+
+
+class SMTPSink(Sink):
+    """Email messages through an SMTP server."""
+
+    name = 'smtp'
+
+    def __init__(self, host, port, sender, user=None, password=None,
+                 timeout=SINK_TIMEOUT):
+        """Send through the server, logging in if user is given."""
+        super().__init__(timeout)
+        self.host = host
+        self.port = port
+        self.sender = sender
+        self.user = user
+        self.password = password
+
+    def send(self, target, text):
+        """Email text to the address."""
+        message = EmailMessage()
+        message['Subject'] = EMAIL_SUBJECT
+        message['From'] = self.sender
+        message['To'] = target
+        message.set_content(text)
+        with smtplib.SMTP(self.host, self.port, timeout=self.timeout) as smtp:
+            smtp.starttls()
+            if self.user:
+                smtp.login(self.user, self.password)
+            smtp.send_message(message)
+
+
+class FileSink(Sink):
+    """Append messages to a local file, one per line.
+
+    File operations take no timeout, so each write runs in a thread
+    of its own that is abandoned if it hangs, on a stale network mount
+    or a pipe without a reader.
+    """
+
+    name = 'file'
+
+    def send(self, target, text):
+        """Append text to the file; raise TimeoutError if it takes too long."""
+        result = Future()
+
+        def append():
+            try:
+                with open(target, 'a', encoding='utf-8') as file:
+                    file.write(text.replace('\n', ' ') + '\n')
+            except Exception as error:
+                result.set_exception(error)
+            else:
+                result.set_result(None)
+
+        threading.Thread(target=append, daemon=True).start()
+        result.result(timeout=self.timeout)
+
+
+def parse_destination(destination):
+    """Split 'sink:target' into its parts; bare values are Telegram chats."""
+    sink, separator, target = str(destination).partition(':')
+    if not separator:
+        return DEFAULT_SINK, str(destination)
+    return sink, target
+
+
+def check_destinations(sinks, destinations):
+    """Raise ValueError for destinations without a configured sink."""
+    for destination in destinations:
+        sink, _ = parse_destination(destination)
+        if sink not in sinks:
+            raise ValueError(UNKNOWN_SINK_MESSAGE.format(
+                destination=destination, sink=sink
+            ))
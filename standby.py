@@ -0,0 +1,220 @@
+import json
+import logging
+import os
+import socket
+import sqlite3
+import threading
+
+from bot_exceptions import LeaseLostError
+
+LEASE_NAME = 'poller'
+LEASE_TTL = 15
+WARM_INTERVAL = 5
+
+TAKEOVER_MESSAGE = 'Instance {holder} took over polling, lease epoch {epoch}'
+LEASE_LOST_MESSAGE = 'Instance {holder} lost the polling lease'
+LEASE_STALLED_MESSAGE = ('Instance {holder} let the polling lease expire '
+                         'while its poll loop was stalled')
+
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS lease (
+    name TEXT PRIMARY KEY,
+    holder TEXT NOT NULL,
+    epoch INTEGER NOT NULL,
+    expires REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS checkpoint (
+    tenant TEXT PRIMARY KEY,
+    timestamp INTEGER,
+    last_messages TEXT NOT NULL,
+    saved REAL NOT NULL
+);
+'''
+
+
+def connect(path):
+    """Open a connection shared by the threads of one instance."""
+    db = sqlite3.connect(
+        path, check_same_thread=False, isolation_level=None, timeout=5
+    )
+    db.execute('PRAGMA journal_mode=WAL')
+    db.executescript(SCHEMA)
+    return db
+
+
+def instance_name():
+    """Return a name telling this process apart from its peers."""
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+class Lease:
+    """Exclusive right to poll, held by one instance at a time.
+
+    The holder renews the lease well before `ttl` runs out; if it
+    stops doing so, another instance may take the lease over.
+    The epoch grows with every change of holder.
+    """
+
+    def __init__(self, path, clock, holder=None, ttl=LEASE_TTL,
+                 name=LEASE_NAME):
+        """Use the lease stored in the SQLite file at path."""
+        self.clock = clock
+        self.holder = holder or instance_name()
+        self.ttl = ttl
+        self.name = name
+        self.held = False
+        self.epoch = None
+        self.expires = None
+        self._db = connect(path)
+        self._lock = threading.Lock()
+
+    def try_acquire(self):
+        """Take or renew the lease; return True if this instance holds it."""
+        now = self.clock.time()
+        with self._lock:
+            try:
+                self._db.execute('BEGIN IMMEDIATE')
+                row = self._db.execute(
+                    'SELECT holder, epoch, expires FROM lease WHERE name = ?',
+                    (self.name,)
+                ).fetchone()
+                holder, epoch, expires = row or (None, 0, 0)
+                if holder != self.holder and expires > now:
+                    self._db.execute('ROLLBACK')
+                    self.held = False
+                    return False
+                if holder != self.holder:
+                    epoch += 1
+                self._db.execute(
+                    'INSERT OR REPLACE INTO lease '
+                    '(name, holder, epoch, expires) VALUES (?, ?, ?, ?)',
+                    (self.name, self.holder, epoch, now + self.ttl)
+                )
+                self._db.execute('COMMIT')
+            except sqlite3.OperationalError:
+                if self._db.in_transaction:
+                    self._db.execute('ROLLBACK')
+                self.held = False
+                return False
+        self.held = True
+        self.epoch = epoch
+        self.expires = now + self.ttl
+        return True
+
+    def release(self):
+        """Give the lease up so a standby can take over at once."""
+        with self._lock:
+            self._db.execute(
+                'DELETE FROM lease WHERE name = ? AND holder = ?',
+                (self.name, self.holder)
+            )
+        self.held = False
+
+    def heartbeat(self, healthy=None):
+        """Renew a held lease forever; meant to be the target of a thread.
+
+        While healthy() is false the lease is not renewed, so a standby
+        takes over from an instance whose poll loop hangs.
+        """
+        while True:
+            renew = healthy is None or healthy()
+            if self.held and renew and not self.try_acquire():
+                logging.error(LEASE_LOST_MESSAGE.format(holder=self.holder))
+            elif self.held and not renew and self.clock.time() >= self.expires:
+                self.held = False
+                logging.error(LEASE_STALLED_MESSAGE.format(
+                    holder=self.holder
+                ))
+            self.clock.sleep(self.ttl / 3)
+
+
+class Checkpoints:
+    """Polling state of every tenant, shared between instances."""
+
+    def __init__(self, path, clock):
+        """Use the checkpoints stored in the SQLite file at path."""
+        self.clock = clock
+        self._db = connect(path)
+        self._lock = threading.Lock()
+
+    def save(self, subscriptions):
+        """Store every subscription's timestamp and last messages."""
+        now = self.clock.time()
+        rows = [
+            (
+                subscription.tenant, subscription.timestamp,
+                json.dumps({
+                    str(subscriber.destination): subscriber.last_message
+                    for subscriber in subscription.subscribers
+                }),
+                now,
+            )
+            for subscription in subscriptions
+        ]
+        with self._lock:
+            self._db.executemany(
+                'INSERT OR REPLACE INTO checkpoint '
+                '(tenant, timestamp, last_messages, saved) '
+                'VALUES (?, ?, ?, ?)',
+                rows
+            )
+
+    def restore(self, subscriptions):
+        """Load the latest saved state into the subscriptions."""
+        with self._lock:
+            rows = dict(
+                (tenant, (timestamp, last_messages))
+                for tenant, timestamp, last_messages in self._db.execute(
+                    'SELECT tenant, timestamp, last_messages FROM checkpoint'
+                )
+            )
+        for subscription in subscriptions:
+            if subscription.tenant not in rows:
+                continue
+            timestamp, last_messages = rows[subscription.tenant]
+            last_messages = json.loads(last_messages)
+            subscription.timestamp = timestamp
+            for subscriber in subscription.subscribers:
+                subscriber.last_message = last_messages.get(
+                    str(subscriber.destination)
+                )
+
+
+def checkpoint_hook(checkpoints, lease=None):
+    """Return a poll cycle hook saving state and enforcing the lease."""
+    def on_cycle(subscriptions):
+        if lease is not None and not lease.held:
+            raise LeaseLostError(LEASE_LOST_MESSAGE.format(
+                holder=lease.holder
+            ))
+        checkpoints.save(subscriptions)
+    return on_cycle
+
+
+def run_standby(lease, clock, active, warm, interval=WARM_INTERVAL,
+                healthy=None, idle=None):
+    """Stay on standby until the lease is ours, then run active().
+
+    warm() is called while waiting and right before taking over;
+    active() returns control by raising LeaseLostError.
+    The lease is only renewed while healthy() is true; idle() is
+    called once active() has given the lease up.
+    """
+    threading.Thread(
+        target=lease.heartbeat, args=(healthy,), daemon=True
+    ).start()
+    while True:
+        if not lease.try_acquire():
+            warm()
+            clock.sleep(interval)
+            continue
+        warm()
+        logging.warning(TAKEOVER_MESSAGE.format(
+            holder=lease.holder, epoch=lease.epoch
+        ))
+        try:
+            active()
+        except LeaseLostError as error:
+            logging.error(error)
+            if idle is not None:
+                idle()
@@ -0,0 +1,46 @@
+import hashlib
+
+from sinks import parse_destination
+
+
+def tenant_name(token):
+    """Return a stable label for the token that is safe to log."""
+    return hashlib.sha256(str(token).encode()).hexdigest()[:8]
+
+
+class Subscriber:
+    """Delivery state of a single destination.
+
+    A destination is 'sink:target', a bare value is a Telegram chat id.
+    """
+
+    def __init__(self, destination):
+        """Subscribe a 'sink:target' destination."""
+        self.destination = destination
+        self.sink, self.target = parse_destination(destination)
+        self.last_message = None
+
+
+class Subscription:
+    """Destinations following the same Practicum token."""
+
+    def __init__(self, token, destinations):
+        """Subscribe the destinations to the token."""
+        self.token = token
+        self.tenant = tenant_name(token)
+        self.subscribers = [
+            Subscriber(destination) for destination in destinations
+        ]
+        self.timestamp = None
+
+
+def build_subscriptions(spec):
+    """Group destinations by token so each token is fetched once per cycle.
+
+    spec maps a Practicum token to an iterable of destinations;
+    repeated destinations are only subscribed once.
+    """
+    return [
+        Subscription(token, dict.fromkeys(destinations))
+        for token, destinations in spec.items()
+    ]
@@ -0,0 +1,65 @@
+import requests
+from requests.adapters import HTTPAdapter
+
+from bot_exceptions import TelegramAPIError
+
+API_URL = 'https://api.telegram.org/bot{token}/{method}'
+REQUEST_TIMEOUT = 10
+POOL_SIZE = 4
+
+
+class TelegramClient:
+    """Minimal Telegram Bot API client over a pooled HTTP session.
+
+    Only covers what the bot needs, with the same call signatures
+    as telegram.Bot.send_message, and does not depend on
+    python-telegram-bot.
+    """
+
+    def __init__(self, token, timeout=REQUEST_TIMEOUT, pool_size=POOL_SIZE):
+        """Talk to the Bot API on behalf of the token."""
+        self.token = token
+        self.timeout = timeout
+        self.session = requests.Session()
+        adapter = HTTPAdapter(
+            pool_connections=1, pool_maxsize=pool_size
+        )
+        self.session.mount('https://', adapter)
+
+    def _call(self, method, payload, timeout=None):
+        response = self.session.post(
+            API_URL.format(token=self.token, method=method),
+            json=payload, timeout=timeout or self.timeout
+        )
+        try:
+            data = response.json()
+        except ValueError:
+            response.raise_for_status()
+            raise
+        if not data.get('ok'):
+            raise TelegramAPIError(
+                data.get('description'),
+                error_code=data.get('error_code'),
+                retry_after=data.get('parameters', {}).get('retry_after')
+            )
+        return data['result']
+
+    def send_message(self, chat_id, text, timeout=None, **kwargs):
+        """Send a text message; return the sent message as a dict."""
+        return self._call(
+            'sendMessage', {'chat_id': chat_id, 'text': text, **kwargs},
+            timeout
+        )
+
+    def get_me(self):
+        """Return the bot's own user, used to validate the token."""
+        return self._call('getMe', {})
+
+    def get_updates(self, offset=None, limit=None, timeout=0):
+        """Long-poll for incoming updates; return them as dicts."""
+        payload = {'timeout': timeout}
+        if offset is not None:
+            payload['offset'] = offset
+        if limit is not None:
+            payload['limit'] = limit
+        return self._call('getUpdates', payload, self.timeout + timeout)
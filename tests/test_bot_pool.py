@@ -0,0 +1,104 @@
+import pytest
+from telegram.error import Unauthorized
+
+from bot_exceptions import NoBotAvailableError, TelegramAPIError
+from bot_pool import BotPool
+from clock import VirtualClock
+
+
+class FakeClient:
+
+    def __init__(self):
+        self.sent = []
+        self.error = None
+        self.blocked = {}
+
+    def send_message(self, chat_id, text, **kwargs):
+        if self.error:
+            raise self.error
+        if chat_id in self.blocked:
+            raise self.blocked[chat_id]
+        self.sent.append(chat_id)
+
+    def get_me(self):
+        if self.error:
+            raise self.error
+
+
+def make_pool(size):
+    clients = [FakeClient() for _ in range(size)]
+    clock = VirtualClock()
+    pool = BotPool(
+        [(str(number), client) for number, client in enumerate(clients)],
+        clock
+    )
+    return pool, clients, clock
+
+
+def test_chats_are_spread_and_sticky():
+    pool, clients, _ = make_pool(2)
+    for _ in range(3):
+        for chat_id in ('a', 'b', 'c', 'd'):
+            pool.send_message(chat_id=chat_id, text='hi')
+    assert sorted(map(len, (clients[0].sent, clients[1].sent))) == [6, 6]
+    assert len(set(clients[0].sent) & set(clients[1].sent)) == 0
+
+
+def test_throttled_bot_fails_over_until_retry_after():
+    pool, clients, clock = make_pool(2)
+    pool.send_message(chat_id='a', text='hi')
+    owner, other = clients if clients[0].sent else clients[::-1]
+    owner.error = TelegramAPIError('slow down', 429, retry_after=30)
+    pool.send_message(chat_id='a', text='hi')
+    assert other.sent == ['a']
+    owner.error = None
+    clock.sleep(31)
+    pool.send_message(chat_id='b', text='hi')
+    assert owner.sent == ['a', 'b']
+
+
+def test_revoked_bots_are_dropped():
+    pool, clients, _ = make_pool(2)
+    for client in clients:
+        client.error = TelegramAPIError('Unauthorized', 401)
+    with pytest.raises(NoBotAvailableError):
+        pool.send_message(chat_id='a', text='hi')
+    assert all(state['revoked'] for state in pool.metrics().values())
+
+
+def test_check_keeps_bots_it_could_not_reach():
+    pool, clients, _ = make_pool(3)
+    clients[0].error = TelegramAPIError('Unauthorized', 401)
+    clients[1].error = ConnectionError()
+    pool.check()
+    assert [bot.revoked for bot in pool.bots] == [True, False, False]
+    clients[1].error = clients[2].error = clients[0].error
+    with pytest.raises(NoBotAvailableError):
+        pool.check()
+
+
+def test_chat_specific_errors_are_raised():
+    pool, clients, _ = make_pool(2)
+    for client in clients:
+        client.error = TelegramAPIError('Forbidden: bot was blocked', 403)
+    with pytest.raises(TelegramAPIError):
+        pool.send_message(chat_id='a', text='hi')
+
+
+def test_blocked_chat_does_not_revoke_bots():
+    pool, clients, _ = make_pool(3)
+    for client in clients:
+        client.blocked['a'] = Unauthorized(
+            'Forbidden: bot was blocked by the user'
+        )
+    with pytest.raises(Unauthorized):
+        pool.send_message(chat_id='a', text='hi')
+    assert not any(bot.revoked for bot in pool.bots)
+    pool.send_message(chat_id='b', text='hi')
+
+
+def test_unauthorized_token_is_revoked():
+    pool, clients, _ = make_pool(2)
+    clients[0].error = Unauthorized('Unauthorized')
+    pool.check()
+    assert [bot.revoked for bot in pool.bots] == [True, False]
@@ -0,0 +1,126 @@
+import json
+from urllib.request import urlopen
+
+import requests
+
+from clock import VirtualClock
+from flight_recorder import FlightRecorder
+from health import serve_health, Watchdog
+from outbox import Outbox
+from subscriptions import build_subscriptions
+
+import homework
+
+
+class RawResponse:
+    status_code = 200
+
+    def __init__(self, content):
+        self.content = content
+
+    def json(self):
+        return json.loads(self.content)
+
+
+def record(recorder, tenant, body):
+    recorder.record(tenant, {'from_date': 0}, 200, 0.0, 0.1, body)
+
+
+def test_ring_keeps_the_latest_entries():
+    recorder = FlightRecorder(slots=4)
+    for number in range(10):
+        record(recorder, 'a' if number % 2 else 'b', str(number).encode())
+    assert [entry['body'] for entry in recorder.entries()] == [
+        '6', '7', '8', '9'
+    ]
+    assert [entry['body'] for entry in recorder.entries('a')] == ['7', '9']
+
+
+def test_long_bodies_are_truncated():
+    recorder = FlightRecorder(slots=2, slot_size=256)
+    record(recorder, 'a', b'x' * 1000)
+    entry, = recorder.entries()
+    assert entry['truncated']
+    assert 0 < len(entry['body']) < 256
+
+
+def test_file_outlives_the_recorder(tmp_path):
+    path = str(tmp_path / 'flight')
+    record(FlightRecorder(path, slots=4), 'a', b'before crash')
+    recorder = FlightRecorder(path, slots=4)
+    record(recorder, 'a', b'after restart')
+    assert [entry['body'] for entry in recorder.entries()] == [
+        'before crash', 'after restart'
+    ]
+    assert [entry['body'] for entry in FlightRecorder(path).entries()] == []
+
+
+def test_token_is_not_recorded(monkeypatch):
+    recorder = FlightRecorder(slots=4)
+    monkeypatch.setattr(
+        requests, 'get', lambda **kwargs: RawResponse(b'{"homeworks": []}')
+    )
+    homework.fetch_statuses('secret-token', 100, recorder)
+    entry, = recorder.entries()
+    assert 'secret-token' not in json.dumps(entry)
+    assert entry['params']['params'] == {'from_date': 100}
+    assert entry['body'] == '{"homeworks": []}'
+
+
+def test_rejected_answer_is_dumped_once(tmp_path, monkeypatch):
+    clock = VirtualClock()
+    recorder = FlightRecorder(slots=4)
+    watchdog = Watchdog(clock, recorder=recorder, dump_directory=tmp_path)
+    subscription, = build_subscriptions({'token': ['chat']})
+    subscription.timestamp = 0
+    outbox = Outbox(str(tmp_path / 'outbox.sqlite3'), clock)
+    monkeypatch.setattr(
+        requests, 'get', lambda **kwargs: RawResponse(b'{"homework": []}')
+    )
+    fetch = homework.make_fetch(watchdog)
+    for _ in range(3):
+        homework.poll_subscription(
+            outbox, subscription, fetch, watchdog
+        )
+    dumps = list(tmp_path.glob('flight-*.json'))
+    assert len(dumps) == 1
+    dump = json.loads(dumps[0].read_text())
+    assert 'homeworks' in dump['reason']
+    assert dump['entries'][-1]['body'] == '{"homework": []}'
+
+
+def test_error_is_dumped_again_after_recovery(tmp_path, monkeypatch):
+    clock = VirtualClock()
+    watchdog = Watchdog(
+        clock, recorder=FlightRecorder(slots=4), dump_directory=tmp_path
+    )
+    subscription, = build_subscriptions({'token': ['chat']})
+    subscription.timestamp = 0
+    outbox = Outbox(str(tmp_path / 'outbox.sqlite3'), clock)
+    fetch = homework.make_fetch(watchdog)
+    dumped = []
+    for body in (b'{"homework": []}', b'{"homeworks": []}',
+                 b'{"homework": []}'):
+        monkeypatch.setattr(
+            requests, 'get', lambda body=body, **kwargs: RawResponse(body)
+        )
+        monkeypatch.setattr(
+            'flight_recorder.time.strftime', lambda format: str(len(dumped))
+        )
+        homework.poll_subscription(outbox, subscription, fetch, watchdog)
+        dumped.append(len(list(tmp_path.glob('flight-*.json'))))
+    assert dumped == [1, 1, 2]
+
+
+def test_entries_are_served_locally():
+    recorder = FlightRecorder(slots=4)
+    record(recorder, 'a', b'{}')
+    server = serve_health(Watchdog(VirtualClock(), recorder=recorder), 0)
+    url = 'http://127.0.0.1:{}/flight-recorder'.format(
+        server.server_address[1]
+    )
+    try:
+        with urlopen(url) as response:
+            assert json.load(response)[0]['body'] == '{}'
+    finally:
+        server.shutdown()
@@ -0,0 +1,67 @@
+import json
+from urllib.error import HTTPError
+from urllib.request import urlopen
+
+from clock import VirtualClock
+from health import serve_health, Watchdog
+from simulation import make_simulation, simulate, SIMULATION_START
+from subscriptions import build_subscriptions
+
+import homework
+
+CYCLE = homework.RETRY_TIME
+
+
+def test_hung_request_is_reported_once(caplog):
+    api, bot = make_simulation()
+    api.hang(SIMULATION_START + CYCLE * 3, SIMULATION_START + CYCLE * 4, 300)
+    watchdog = Watchdog(api.clock)
+    cycles = simulate(
+        api, bot, until=SIMULATION_START + CYCLE * 10, watchdog=watchdog
+    )
+    assert cycles == 10
+    assert watchdog.stalls == 1
+    assert 'in __call__' in caplog.text
+
+
+def test_loop_lag_is_measured():
+    clock = VirtualClock()
+    watchdog = Watchdog(clock)
+    watchdog.cycle_start()
+    watchdog.cycle_end(10)
+    clock.sleep(12)
+    watchdog.cycle_start()
+    assert watchdog.lag == 2
+
+
+def test_ready_once_every_tenant_was_fetched():
+    clock = VirtualClock()
+    subscriptions = build_subscriptions({'a': [1], 'b': [2]})
+    watchdog = Watchdog(clock, subscriptions)
+    assert watchdog.live()
+    assert not watchdog.ready()
+    for subscription in subscriptions:
+        watchdog.fetch_succeeded(subscription.tenant)
+    assert watchdog.ready()
+    clock.sleep(watchdog.stale_after + 1)
+    assert not watchdog.ready()
+
+
+def test_health_endpoint():
+    clock = VirtualClock()
+    watchdog = Watchdog(clock, build_subscriptions({'a': [1]}))
+    server = serve_health(watchdog, 0)
+    host, port = server.server_address
+    assert host == '127.0.0.1'
+    url = 'http://127.0.0.1:{}'.format(port)
+    try:
+        with urlopen(url + '/live') as response:
+            assert json.load(response)['live']
+        try:
+            urlopen(url + '/ready')
+        except HTTPError as error:
+            assert error.code == 503
+        else:
+            assert False
+    finally:
+        server.shutdown()
@@ -0,0 +1,97 @@
+import itertools
+import threading
+import time
+
+import pytest
+
+from hedging import HedgeBudget, HedgedCaller
+from latency import LatencyWindow
+from limiter import AdaptiveLimiter
+
+
+def test_percentile():
+    window = LatencyWindow()
+    for seconds in range(1, 101):
+        window.add(seconds)
+    assert window.percentile(50) == 51
+    assert window.percentile(100) == 100
+
+
+def test_budget_caps_hedges():
+    budget = HedgeBudget(0.1)
+    spent = 0
+    for _ in range(100):
+        budget.earn()
+        spent += budget.spend()
+    assert spent == 10
+
+
+def test_slow_call_is_hedged_and_backup_wins():
+    calls = itertools.count()
+
+    def fetch(token):
+        if next(calls) == 5:
+            time.sleep(1)
+            return 'slow'
+        return 'fast'
+
+    caller = HedgedCaller(fetch, budget=1, min_samples=5)
+    for _ in range(5):
+        caller('token')
+    started = time.perf_counter()
+    assert caller('token') == 'fast'
+    assert time.perf_counter() - started < 0.5
+    metrics = caller.metrics()
+    assert metrics['hedges'] == 1
+    assert metrics['win_rate'] == 1
+
+
+def test_error_is_raised_when_both_calls_fail():
+    calls = itertools.count()
+
+    def fetch():
+        if next(calls) >= 3:
+            time.sleep(0.1)
+            raise ConnectionError
+        return 'ok'
+
+    caller = HedgedCaller(fetch, budget=1, min_samples=3)
+    for _ in range(3):
+        caller()
+    with pytest.raises(ConnectionError):
+        caller()
+    assert caller.hedges == 1
+    assert caller.wins == 0
+
+
+def test_failures_are_not_timed():
+    def fetch(fail):
+        if fail:
+            raise ConnectionError
+        time.sleep(0.01)
+
+    caller = HedgedCaller(fetch)
+    for _ in range(3):
+        with pytest.raises(ConnectionError):
+            caller(True)
+    caller(False)
+    assert len(caller.latency) == 1
+
+
+def test_waiting_for_the_limiter_is_not_hedged():
+    limiter = AdaptiveLimiter(initial=1, maximum=1)
+    caller = HedgedCaller(
+        lambda: 'ok', budget=1, min_samples=3, limiter=limiter
+    )
+    for _ in range(3):
+        caller()
+    limiter.acquire()
+    result = []
+    thread = threading.Thread(target=lambda: result.append(caller()))
+    thread.start()
+    time.sleep(0.2)
+    limiter.release(0.2)
+    thread.join(5)
+    assert result == ['ok']
+    assert caller.hedges == 0
+    assert caller.latency.percentile(100) < 0.1
@@ -0,0 +1,39 @@
+from latency import LatencyTracker
+from simulation import make_simulation, simulate, SIMULATION_START
+
+import homework
+
+CYCLE = homework.RETRY_TIME
+
+
+def test_latency_is_measured_from_date_updated():
+    api, bot = make_simulation()
+    api.set_status(SIMULATION_START + 1, 1, 'reviewing')
+    api.set_status(SIMULATION_START + CYCLE * 5 + 1, 1, 'approved')
+    tracker = LatencyTracker(slo=CYCLE)
+    simulate(
+        api, bot, until=SIMULATION_START + CYCLE * 10, tracker=tracker
+    )
+    report = tracker.report()
+    assert report['global']['delivered'] == 2
+    assert report['global']['detection']['p50'] == CYCLE - 1
+    total = report['global']['total']['p99']
+    assert CYCLE - 1 < total <= CYCLE + 60
+    assert report['global']['slo_violations'] == 2
+    assert list(report['tenants'].values())[0]['delivered'] == 2
+
+
+def test_error_reports_are_not_tracked():
+    api, bot = make_simulation()
+    api.outage(SIMULATION_START, SIMULATION_START + CYCLE)
+    tracker = LatencyTracker()
+    simulate(api, bot, until=SIMULATION_START + CYCLE * 3, tracker=tracker)
+    assert len(bot.sent) == 1
+    assert tracker.report()['global']['delivered'] == 0
+
+
+def test_updated_at():
+    assert homework.updated_at(
+        {'date_updated': '2020-02-13T14:40:57Z'}
+    ) == 1581604857
+    assert homework.updated_at({}) is None
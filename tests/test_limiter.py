@@ -0,0 +1,104 @@
+from concurrent.futures import ThreadPoolExecutor
+import math
+import random
+import threading
+import time
+
+import pytest
+import requests
+
+from bot_exceptions import APIOverloadError, ServiceDeniedError
+from limiter import AdaptiveLimiter
+
+import homework
+
+
+def test_limit_grows_additively_on_success():
+    limiter = AdaptiveLimiter(initial=2, tolerance=float('inf'))
+    for _ in range(4):
+        limiter.call(lambda: None)
+    assert 3 < limiter.limit < 4
+
+
+def test_limit_halves_on_overload():
+    limiter = AdaptiveLimiter(initial=8)
+
+    def overloaded():
+        raise APIOverloadError
+
+    for expected in (4, 2, 1, 1):
+        with pytest.raises(APIOverloadError):
+            limiter.call(overloaded)
+        assert limiter.limit == expected
+
+
+def test_other_errors_keep_the_limit():
+    limiter = AdaptiveLimiter(initial=8)
+    with pytest.raises(KeyError):
+        limiter.call({}.__getitem__, 'key')
+    for error in (ServiceDeniedError(), ValueError()):
+        limiter.acquire()
+        limiter.release(0.1, error)
+    assert limiter.limit == 8
+
+
+def test_burst_of_errors_decreases_once():
+    limiter = AdaptiveLimiter(initial=8)
+    for _ in range(8):
+        limiter.acquire()
+    for _ in range(8):
+        limiter.release(0.1, APIOverloadError())
+    assert limiter.limit == 4
+    assert limiter.decreases == 1
+
+
+def test_jitter_does_not_decrease_the_limit():
+    limiter = AdaptiveLimiter(initial=4)
+    jitter = random.Random(1)
+    for _ in range(5000):
+        limiter.acquire()
+        limiter.release(jitter.lognormvariate(math.log(0.1), 0.3))
+    assert limiter.decreases == 0
+    assert limiter.limit == limiter.maximum
+
+
+def test_limit_shrinks_when_latency_degrades():
+    limiter = AdaptiveLimiter(initial=8, tolerance=2)
+    for latency in (0.01, 0.5):
+        limiter.acquire()
+        limiter.release(latency)
+    assert limiter.limit < 8
+    assert limiter.decreases == 1
+
+
+def test_in_flight_calls_stay_under_the_limit():
+    limiter = AdaptiveLimiter(initial=2, maximum=2)
+    lock = threading.Lock()
+    running = []
+    peak = []
+
+    def call():
+        with lock:
+            running.append(1)
+            peak.append(len(running))
+        time.sleep(0.02)
+        with lock:
+            running.pop()
+
+    with ThreadPoolExecutor(8) as executor:
+        list(executor.map(lambda _: limiter.call(call), range(16)))
+    assert max(peak) == 2
+    assert limiter.metrics()['queue_delay_p95'] > 0
+
+
+def test_timed_out_fetch_lowers_the_limit(monkeypatch):
+    def hang(**kwargs):
+        assert kwargs['timeout'] == homework.API_TIMEOUT
+        raise requests.exceptions.ReadTimeout
+
+    monkeypatch.setattr(requests, 'get', hang)
+    limiter = AdaptiveLimiter(initial=8)
+    with pytest.raises(TimeoutError) as error:
+        limiter.call(homework.fetch_statuses, 'secret-token', 0)
+    assert 'secret-token' not in str(error.value)
+    assert limiter.limit == 4
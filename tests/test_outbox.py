@@ -0,0 +1,103 @@
+import sqlite3
+
+from clock import VirtualClock
+from outbox import DeliveryWorker, ERROR_PRIORITY, Outbox, STATUS_PRIORITY
+from simulation import make_simulation, simulate, SIMULATION_START
+
+import homework
+
+
+def test_status_changes_are_delivered_before_errors():
+    clock = VirtualClock()
+    outbox = Outbox(':memory:', clock)
+    outbox.enqueue('chat', 'error', priority=ERROR_PRIORITY)
+    outbox.enqueue('chat', 'status', key='1', priority=STATUS_PRIORITY)
+    sent = []
+    worker = DeliveryWorker(outbox, lambda *args: sent.append(args) or True, clock)
+    worker.run_once()
+    assert sent == [('chat', 'status'), ('chat', 'error')]
+    assert outbox.pending() == 0
+
+
+def test_keyed_notification_is_queued_once():
+    outbox = Outbox(':memory:', VirtualClock())
+    assert outbox.enqueue('chat', 'status', key='1')
+    assert not outbox.enqueue('chat', 'status', key='1')
+    assert outbox.pending() == 1
+
+
+def test_delivered_notifications_are_pruned():
+    clock = VirtualClock()
+    outbox = Outbox(':memory:', clock)
+    outbox.enqueue('chat', 'status', key='1')
+    outbox.enqueue('chat', 'pending', key='2')
+    worker = DeliveryWorker(outbox, lambda *args: True, clock, retention=60)
+    outbox.claim(outbox.due()[1].id, timeout=10 ** 6)
+    worker.run_once()
+    clock.sleep(3600)
+    worker.run_once()
+    assert worker.metrics()['pruned'] == 1
+    assert outbox.pending() == 1
+    assert outbox.enqueue('chat', 'status', key='1')
+    assert not outbox.enqueue('chat', 'pending', key='2')
+
+
+def test_undeliverable_notification_is_given_up():
+    clock = VirtualClock()
+    outbox = Outbox(':memory:', clock)
+    outbox.enqueue('blocked', 'status', key='1')
+    worker = DeliveryWorker(
+        outbox, lambda *args: False, clock, max_attempts=3
+    )
+    for _ in range(10):
+        worker.run_once()
+        clock.sleep(3600)
+    assert worker.metrics()['failed'] == 3
+    assert worker.metrics()['dead'] == 1
+    assert outbox.pending() == 0
+    assert not outbox.enqueue('blocked', 'status', key='1')
+
+
+def test_failed_delivery_is_retried_with_backoff():
+    clock = VirtualClock()
+    outbox = Outbox(':memory:', clock)
+    outbox.enqueue('chat', 'status', key='1')
+    results = iter([False, False, True])
+    worker = DeliveryWorker(outbox, lambda *args: next(results), clock)
+    assert worker.run_once() == 0
+    assert worker.run_once() == 0
+    clock.sleep(5)
+    assert worker.run_once() == 0
+    clock.sleep(9)
+    assert worker.run_once() == 0
+    clock.sleep(1)
+    assert worker.run_once() == 1
+
+
+def test_queued_notification_survives_restart(tmp_path):
+    api, bot = make_simulation()
+    outbox = Outbox(str(tmp_path / 'outbox.sqlite3'), api.clock)
+    cycle = homework.RETRY_TIME
+    api.set_status(SIMULATION_START + 1, 1, 'approved')
+    bot.outage(SIMULATION_START, SIMULATION_START + cycle * 3)
+    simulate(
+        api, bot, until=SIMULATION_START + cycle * 10,
+        restarts=[SIMULATION_START + cycle + 1], outbox=outbox
+    )
+    assert len(bot.sent) == 1
+
+
+def test_outbox_created_before_latency_columns_is_migrated(tmp_path):
+    path = str(tmp_path / 'outbox.sqlite3')
+    db = sqlite3.connect(path)
+    db.execute(
+        'CREATE TABLE outbox (id INTEGER PRIMARY KEY, key TEXT UNIQUE, '
+        'chat_id TEXT NOT NULL, text TEXT NOT NULL, '
+        'priority INTEGER NOT NULL, attempts INTEGER NOT NULL DEFAULT 0, '
+        'created REAL NOT NULL, next_attempt REAL NOT NULL, delivered REAL)'
+    )
+    db.close()
+    outbox = Outbox(path, VirtualClock())
+    outbox.enqueue('chat', 'status', key='1', tenant='t', date_updated=0)
+    notification, = outbox.due()
+    assert notification.tenant == 't'
@@ -0,0 +1,78 @@
+import time
+
+import homework
+from simulation import SIMULATION_START, make_simulation, simulate
+
+CYCLE = homework.RETRY_TIME
+
+
+def texts(bot):
+    return [text for _, _, text in bot.sent]
+
+
+def test_thousands_of_cycles_run_instantly():
+    api, bot = make_simulation()
+    started = time.perf_counter()
+    cycles = simulate(api, bot, until=SIMULATION_START + CYCLE * 5000)
+    assert cycles == 5000
+    assert sum(api.calls.values()) == 5000
+    assert time.perf_counter() - started < 5
+
+
+def test_status_change_is_sent_once():
+    api, bot = make_simulation()
+    api.set_status(SIMULATION_START + CYCLE * 2 + 1, 1, 'reviewing')
+    api.set_status(SIMULATION_START + CYCLE * 10 + 1, 1, 'approved')
+    simulate(api, bot, until=SIMULATION_START + CYCLE * 50)
+    assert texts(bot) == [
+        homework.STATUS_CHANGED_MESSAGE.format(
+            name='hw1', verdict=homework.HOMEWORK_VERDICTS[status]
+        )
+        for status in ('reviewing', 'approved')
+    ]
+
+
+def test_api_outage_reports_error_once():
+    api, bot = make_simulation()
+    api.outage(SIMULATION_START + CYCLE, SIMULATION_START + CYCLE * 100)
+    simulate(api, bot, until=SIMULATION_START + CYCLE * 200)
+    assert len(bot.sent) == 1
+    assert texts(bot)[0].startswith('An error occured')
+
+
+def test_update_is_retried_after_telegram_outage():
+    api, bot = make_simulation()
+    api.set_status(SIMULATION_START + 1, 1, 'approved')
+    bot.outage(SIMULATION_START, SIMULATION_START + CYCLE * 20)
+    simulate(api, bot, until=SIMULATION_START + CYCLE * 40)
+    assert len(bot.sent) == 1
+    assert bot.sent[0][0] >= SIMULATION_START + CYCLE * 20
+
+
+def test_restart_starts_cold():
+    api, bot = make_simulation()
+    restart = SIMULATION_START + CYCLE * 10 + 30
+    api.set_status(restart - 10, 1, 'approved')
+    simulate(api, bot, until=restart + CYCLE * 10, restarts=[restart])
+    assert bot.sent == []
+
+
+def test_chats_of_one_token_share_a_fetch():
+    api, bot = make_simulation()
+    api.set_status(SIMULATION_START + CYCLE * 3 + 1, 1, 'approved')
+    spec = {'student': ['student', 'mentor', 'group'], 'other': ['other']}
+    simulate(api, bot, until=SIMULATION_START + CYCLE * 100, spec=spec)
+    assert api.calls == {'student': 100, 'other': 100}
+    assert sorted(chat_id for _, chat_id, _ in bot.sent) == [
+        'group', 'mentor', 'other', 'student'
+    ]
+
+
+def test_chat_left_behind_is_retried():
+    api, bot = make_simulation()
+    api.set_status(SIMULATION_START + 1, 1, 'approved')
+    bot.outage(SIMULATION_START, SIMULATION_START + CYCLE * 5, chat_id='b')
+    simulate(
+        api, bot, until=SIMULATION_START + CYCLE * 20, spec={'t': ['a', 'b']}
+    )
+    assert [chat_id for _, chat_id, _ in bot.sent] == ['a', 'b']
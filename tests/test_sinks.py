@@ -0,0 +1,87 @@
+import os
+
+import pytest
+
+from simulation import make_simulation, simulate, SIMULATION_START
+from sinks import check_destinations, FileSink, parse_destination, Sink
+
+import homework
+
+CYCLE = homework.RETRY_TIME
+
+
+class BrokenSink(Sink):
+    name = 'webhook'
+
+    def __init__(self):
+        super().__init__()
+        self.attempts = 0
+
+    def send(self, target, text):
+        self.attempts += 1
+        raise TimeoutError(target)
+
+
+def test_parse_destination():
+    assert parse_destination(12345) == ('telegram', '12345')
+    assert parse_destination('-100123') == ('telegram', '-100123')
+    assert parse_destination('webhook:https://example.com/hook?a=b') == (
+        'webhook', 'https://example.com/hook?a=b'
+    )
+    assert parse_destination('file:/tmp/a:b.log') == ('file', '/tmp/a:b.log')
+
+
+def test_unknown_sink_is_rejected():
+    with pytest.raises(ValueError):
+        check_destinations({'telegram': None}, ['123', 'pigeon:home'])
+
+
+def test_failing_sink_does_not_hold_up_others(tmp_path):
+    api, bot = make_simulation()
+    api.set_status(SIMULATION_START + 1, 1, 'approved')
+    log = tmp_path / 'notifications.log'
+    webhook = BrokenSink()
+    spec = {'token': ['chat', 'webhook:https://example.com', f'file:{log}']}
+    simulate(
+        api, bot, until=SIMULATION_START + CYCLE * 10, spec=spec,
+        sinks={'webhook': webhook, 'file': FileSink()}
+    )
+    assert len(bot.sent) == 1
+    assert log.read_text(encoding='utf-8') == bot.sent[0][2] + '\n'
+    assert webhook.attempts > 1
+
+
+def test_sink_must_implement_send():
+    with pytest.raises(TypeError):
+        Sink()
+
+
+def test_file_sink_times_out(tmp_path):
+    fifo = str(tmp_path / 'fifo')
+    os.mkfifo(fifo)
+    with pytest.raises(TimeoutError):
+        FileSink(timeout=0.1).send(fifo, 'status')
+    os.close(os.open(fifo, os.O_RDONLY | os.O_NONBLOCK))
+
+
+def test_send_message_goes_through_the_telegram_sink(monkeypatch):
+    sent = []
+
+    class Bot:
+        def send_message(self, **kwargs):
+            sent.append(kwargs)
+
+    monkeypatch.setattr(homework, 'TELEGRAM_CHAT_ID', 'chat')
+    assert homework.send_message(Bot(), 'status')
+    assert sent == [
+        {'chat_id': 'chat', 'text': 'status', 'timeout': homework.SINK_TIMEOUT}
+    ]
+
+
+def test_smtp_sink_requires_a_sender(monkeypatch):
+    monkeypatch.setattr(homework, 'SMTP_HOST', 'smtp.example.com')
+    monkeypatch.setattr(homework, 'SMTP_FROM', None)
+    with pytest.raises(ValueError):
+        homework.load_sinks(None)
+    monkeypatch.setattr(homework, 'SMTP_FROM', 'bot@example.com')
+    assert 'smtp' in homework.load_sinks(None)
@@ -0,0 +1,144 @@
+import pytest
+
+from bot_exceptions import LeaseLostError
+from clock import VirtualClock
+from health import Watchdog
+from outbox import Outbox
+from simulation import (make_simulation, simulate, SIMULATION_START,
+                        SimulationFinished)
+from standby import Checkpoints, checkpoint_hook, Lease, run_standby
+from subscriptions import build_subscriptions
+
+import homework
+
+CYCLE = homework.RETRY_TIME
+
+
+@pytest.fixture
+def path(tmp_path):
+    return str(tmp_path / 'state.sqlite3')
+
+
+def test_lease_is_taken_over_once_it_expires(path):
+    clock = VirtualClock()
+    active = Lease(path, clock, holder='active', ttl=15)
+    standby = Lease(path, clock, holder='standby', ttl=15)
+    assert active.try_acquire()
+    assert not standby.try_acquire()
+    clock.sleep(10)
+    assert active.try_acquire()
+    clock.sleep(10)
+    assert not standby.try_acquire()
+    clock.sleep(6)
+    assert standby.try_acquire()
+    assert standby.epoch == active.epoch + 1
+    assert not active.try_acquire()
+
+
+def test_released_lease_is_free_at_once(path):
+    clock = VirtualClock()
+    active = Lease(path, clock, holder='active')
+    standby = Lease(path, clock, holder='standby')
+    assert active.try_acquire()
+    active.release()
+    assert standby.try_acquire()
+
+
+def test_stalled_instance_lets_the_lease_expire(path):
+    clock = VirtualClock()
+    start = clock.time()
+    active = Lease(path, clock, holder='active', ttl=15)
+    standby = Lease(path, clock, holder='standby', ttl=15)
+    assert active.try_acquire()
+    taken = []
+    for delay in (35, 45):
+        clock.call_at(
+            start + delay, lambda: taken.append(standby.try_acquire())
+        )
+
+    def finish():
+        raise SimulationFinished
+
+    clock.call_at(start + 60, finish)
+    with pytest.raises(SimulationFinished):
+        active.heartbeat(lambda: clock.time() < start + 30)
+    assert taken == [False, True]
+    assert not active.held
+
+
+class OnceLease:
+    holder = 'active'
+    epoch = 1
+
+    def __init__(self):
+        self.grants = [True]
+
+    def try_acquire(self):
+        return bool(self.grants) and self.grants.pop()
+
+    def heartbeat(self, healthy):
+        pass
+
+
+def test_demoted_instance_stays_live():
+    clock = VirtualClock()
+    watchdog = Watchdog(clock, cycle_budget=60)
+
+    def active():
+        watchdog.cycle_start()
+        watchdog.cycle_end(10)
+        raise LeaseLostError
+
+    def finish():
+        raise SimulationFinished
+
+    clock.call_at(clock.time() + 120, finish)
+    with pytest.raises(SimulationFinished):
+        run_standby(
+            OnceLease(), clock, active, lambda: None,
+            healthy=watchdog.live, idle=watchdog.idle
+        )
+    assert watchdog.live()
+
+
+def test_checkpoints_round_trip(path):
+    clock = VirtualClock()
+    saved = build_subscriptions({'token': ['a', 'webhook:https://b']})
+    saved[0].timestamp = 123
+    saved[0].subscribers[1].last_message = 'approved'
+    Checkpoints(path, clock).save(saved)
+    restored = build_subscriptions({'token': ['a', 'webhook:https://b']})
+    Checkpoints(path, clock).restore(restored)
+    assert restored[0].timestamp == 123
+    assert [s.last_message for s in restored[0].subscribers] == [
+        None, 'approved'
+    ]
+
+
+def test_demoted_instance_stops_polling(path):
+    clock = VirtualClock()
+    lease = Lease(path, clock, holder='active')
+    hook = checkpoint_hook(Checkpoints(path, clock), lease)
+    with pytest.raises(LeaseLostError):
+        hook([])
+
+
+def test_restart_resumes_from_checkpoint(path):
+    api, bot = make_simulation()
+    restart = SIMULATION_START + CYCLE * 10 + 30
+    api.set_status(restart - 10, 1, 'approved')
+    simulate(
+        api, bot, until=restart + CYCLE * 10, restarts=[restart],
+        checkpoints=Checkpoints(path, api.clock)
+    )
+    assert len(bot.sent) == 1
+
+
+def test_message_is_claimed_by_one_instance(path):
+    clock = VirtualClock()
+    first, second = Outbox(path, clock), Outbox(path, clock)
+    first.enqueue('chat', 'status', key='1')
+    notification, = second.due()
+    assert first.claim(notification.id)
+    assert not second.claim(notification.id)
+    assert second.due() == []
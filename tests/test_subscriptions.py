@@ -0,0 +1,39 @@
+import requests
+
+from clock import VirtualClock
+from health import Watchdog
+from outbox import Outbox
+from subscriptions import build_subscriptions
+
+import homework
+
+
+def test_build_subscriptions_deduplicates_chats():
+    subscription, = build_subscriptions({'token': ['a', 'b', 'a']})
+    assert [s.target for s in subscription.subscribers] == ['a', 'b']
+
+
+class DeniedResponse:
+    status_code = 401
+
+    def json(self):
+        return {'code': 'not_authenticated', 'error': 'Bad token'}
+
+
+def test_error_reports_do_not_leak_the_token(tmp_path, monkeypatch):
+    clock = VirtualClock()
+    outbox = Outbox(str(tmp_path / 'outbox.sqlite3'), clock)
+    subscription, = build_subscriptions(
+        {'secret-token': ['student', 'webhook:https://example.com']}
+    )
+    subscription.timestamp = 0
+    monkeypatch.setattr(requests, 'get', lambda **kwargs: DeniedResponse())
+    homework.poll_subscription(
+        outbox, subscription, homework.fetch_statuses,
+        Watchdog(clock)
+    )
+    queued = outbox.due()
+    assert len(queued) == 2
+    for notification in queued:
+        assert 'Bad token' in notification.text
+        assert 'secret-token' not in notification.text
@@ -0,0 +1,64 @@
+import os
+import subprocess
+import sys
+
+import pytest
+
+from bot_exceptions import TelegramAPIError
+from telegram_client import TelegramClient
+
+
+class MockResponse:
+
+    def __init__(self, data):
+        self.data = data
+
+    def json(self):
+        return self.data
+
+
+def test_send_message(monkeypatch):
+    client = TelegramClient('123:abc')
+    requests = []
+
+    def post(url, json=None, timeout=None):
+        requests.append((url, json, timeout))
+        return MockResponse({'ok': True, 'result': {'message_id': 1}})
+
+    monkeypatch.setattr(client.session, 'post', post)
+    assert client.send_message(chat_id=42, text='hi') == {'message_id': 1}
+    assert requests == [(
+        'https://api.telegram.org/bot123:abc/sendMessage',
+        {'chat_id': 42, 'text': 'hi'}, 10
+    )]
+
+
+def test_refused_request_raises(monkeypatch):
+    client = TelegramClient('123:abc')
+    monkeypatch.setattr(client.session, 'post', lambda *a, **k: MockResponse({
+        'ok': False, 'error_code': 429, 'description': 'Too Many Requests',
+        'parameters': {'retry_after': 7},
+    }))
+    with pytest.raises(TelegramAPIError) as error:
+        client.get_updates()
+    assert error.value.error_code == 429
+    assert error.value.retry_after == 7
+
+
+def test_lite_client_does_not_import_telegram():
+    script = (
+        'import sys\n'
+        'import homework\n'
+        'from clock import SystemClock\n'
+        'pool = homework.load_bots(SystemClock())\n'
+        'pool.metrics()\n'
+        'print(type(pool.bots[0].client).__name__)\n'
+        'print("telegram" in sys.modules)\n'
+    )
+    env = dict(os.environ, TELEGRAM_CLIENT='lite', TG_TOKEN='123:abc')
+    result = subprocess.run(
+        [sys.executable, '-c', script], env=env, capture_output=True,
+        text=True, check=True,
+        cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    )
+    assert result.stdout.split() == ['TelegramClient', 'False']